@@ -0,0 +1,225 @@
+"""
+In-process stand-in for the Google Drive v3 service object.
+Implements the calls the MCP server makes (files().list/get/export_media/get_media,
+changes(), batch requests) over a generated set of folders and files, with a
+fixed per-call latency. Media requests work with MediaIoBaseDownload, including
+ranged (chunked) downloads, so the server's real text extraction code runs.
+"""
+import re
+import json
+import time
+import random
+import threading
+import httplib2
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+
+WORDS = (
+    "budget report quarterly meeting notes project roadmap design review onboarding "
+    "hiring plan sales forecast customer feedback launch timeline risk summary"
+).split()
+
+
+def _make_text(rng, size):
+    """About `size` bytes of text with a heading every few paragraphs."""
+    parts = []
+    length = 0
+    section = 0
+    while length < size:
+        if section % 4 == 0:
+            heading = f"Section {section // 4 + 1}: {rng.choice(WORDS).title()}\n\n"
+            parts.append(heading)
+            length += len(heading)
+        paragraph = " ".join(rng.choice(WORDS) for _ in range(60)).capitalize() + ".\n\n"
+        parts.append(paragraph)
+        length += len(paragraph)
+        section += 1
+    return "".join(parts)[:size]
+
+
+class _Request:
+    """Mimics googleapiclient's HttpRequest: execute(), plus uri/method/body for coalescing."""
+
+    def __init__(self, drive, uri, fn):
+        self.uri = uri
+        self.method = "GET"
+        self.body = None
+        self._drive = drive
+        self._fn = fn
+
+    def execute(self, **kwargs):
+        self._drive.count_call()
+        return self._fn()
+
+
+class _MediaHttp:
+    """Serves byte ranges of one file's content to MediaIoBaseDownload."""
+
+    def __init__(self, drive, data):
+        self._drive = drive
+        self._data = data
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        self._drive.count_call(media=True)
+        start, end = 0, len(self._data) - 1
+        match = re.match(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+        if match:
+            start, end = int(match.group(1)), min(int(match.group(2)), len(self._data) - 1)
+        if not self._data:
+            return httplib2.Response({"status": 416, "content-range": "bytes */0"}), b""
+        content = self._data[start:end + 1]
+        resp = httplib2.Response({"status": 206, "content-range": f"bytes {start}-{end}/{len(self._data)}"})
+        return resp, content
+
+
+class _MediaRequest:
+    def __init__(self, drive, file_id, data):
+        self.uri = f"fake://drive/files/{file_id}/media"
+        self.headers = {}
+        self.http = _MediaHttp(drive, data)
+
+
+class _Batch:
+    def __init__(self, drive, callback):
+        self._drive = drive
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, request_id=None):
+        self._requests.append((request_id, request))
+
+    def execute(self):
+        # One round trip for the whole batch
+        self._drive.count_call()
+        for request_id, request in self._requests:
+            try:
+                self._callback(request_id, request._fn(), None)
+            except Exception as e:
+                self._callback(request_id, None, e)
+
+
+class _Files:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def list(self, q="", pageSize=100, pageToken=None, fields=None, orderBy=None, **kwargs):
+        drive = self._drive
+
+        def run():
+            files = drive.query(q)
+            if orderBy == "modifiedTime desc":
+                files.sort(key=lambda f: f["modifiedTime"], reverse=True)
+            else:
+                files.sort(key=lambda f: (f["name"].lower(), f["id"]))
+            start = int(pageToken or 0)
+            result = {"files": [dict(f) for f in files[start:start + pageSize]]}
+            if start + pageSize < len(files):
+                result["nextPageToken"] = str(start + pageSize)
+            return result
+        return _Request(drive, f"fake://drive/files?{json.dumps([q, pageSize, pageToken, orderBy])}", run)
+
+    def get(self, fileId, fields=None, **kwargs):
+        drive = self._drive
+
+        def run():
+            if fileId not in drive.entries:
+                raise drive.not_found(fileId)
+            return dict(drive.entries[fileId])
+        return _Request(drive, f"fake://drive/files/{fileId}?{fields}", run)
+
+    def export_media(self, fileId, mimeType):
+        return _MediaRequest(self._drive, fileId, self._drive.content[fileId])
+
+    def get_media(self, fileId, **kwargs):
+        return _MediaRequest(self._drive, fileId, self._drive.content[fileId])
+
+
+class _Changes:
+    def __init__(self, drive):
+        self._drive = drive
+
+    def getStartPageToken(self, **kwargs):
+        return _Request(self._drive, "fake://drive/changes/startPageToken", lambda: {"startPageToken": "1"})
+
+    def list(self, pageToken, **kwargs):
+        # The benchmark's Drive never changes
+        return _Request(self._drive, f"fake://drive/changes?{pageToken}", lambda: {"changes": [], "newStartPageToken": pageToken})
+
+
+class FakeDrive:
+    """Fake Drive service: `folders` folders holding `files_per_folder` files of `file_size` bytes each."""
+
+    def __init__(self, folders=5, files_per_folder=20, file_size=20000, latency=0.05, seed=0):
+        self.latency = latency
+        self.entries = {}
+        self.content = {}
+        self.calls = 0
+        self.media_calls = 0
+        self._lock = threading.Lock()
+        rng = random.Random(seed)
+        for i in range(folders):
+            folder_id = f"folder-{i}"
+            self.entries[folder_id] = {
+                "id": folder_id, "name": f"Folder {i}", "mimeType": FOLDER_MIME,
+                "modifiedTime": f"2025-01-{i + 1:02d}T00:00:00Z", "parents": ["root"],
+            }
+            for j in range(files_per_folder):
+                file_id = f"file-{i}-{j}"
+                google_doc = j % 2 == 0
+                self.entries[file_id] = {
+                    "id": file_id,
+                    "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {i}-{j}" + ("" if google_doc else ".txt"),
+                    "mimeType": GOOGLE_DOC_MIME if google_doc else "text/plain",
+                    "modifiedTime": "2025-02-01T00:00:00Z",
+                    "md5Checksum": f"md5-{file_id}",
+                    "parents": [folder_id],
+                }
+                self.content[file_id] = _make_text(rng, file_size).encode()
+
+    def count_call(self, media=False):
+        with self._lock:
+            self.calls += 1
+            if media:
+                self.media_calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def not_found(self, file_id):
+        from googleapiclient.errors import HttpError
+        return HttpError(httplib2.Response({"status": 404}), f"File not found: {file_id}".encode())
+
+    def query(self, q):
+        """Files matching the subset of Drive query syntax the MCP server uses."""
+        files = list(self.entries.values())
+        parents = re.findall(r"'([^']+)' in parents", q)
+        if parents:
+            files = [f for f in files if set(parents) & set(f["parents"])]
+        if f"mimeType='{FOLDER_MIME}'" in q:
+            files = [f for f in files if f["mimeType"] == FOLDER_MIME]
+        terms = re.findall(r"(name|fullText) contains '((?:[^'\\]|\\.)*)'", q)
+        if terms:
+            def matches(f):
+                for field, value in terms:
+                    value = value.replace("\\'", "'").replace("\\\\", "\\").lower()
+                    if field == "name" and value in f["name"].lower():
+                        return True
+                    if field == "fullText" and value.encode() in self.content.get(f["id"], b"").lower():
+                        return True
+                return False
+            files = [f for f in files if matches(f)]
+        return files
+
+    def stats(self):
+        return {"calls": self.calls, "media_calls": self.media_calls}
+
+    # ---- service interface ----
+
+    def files(self):
+        return _Files(self)
+
+    def changes(self):
+        return _Changes(self)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
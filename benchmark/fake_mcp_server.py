@@ -0,0 +1,42 @@
+"""
+Runs the real MCP server (mcp_server/server.py) against the in-process FakeDrive.
+Drive size and latency come from BENCH_* environment variables (set by run.py).
+GET /bench/stats returns the fake Drive's call counts.
+
+Usage: python fake_mcp_server.py --port 8101
+"""
+import os
+import sys
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "mcp_server"))
+
+from starlette.responses import JSONResponse
+from fake_drive import FakeDrive
+import drive_utils
+import server
+
+drive = FakeDrive(
+    folders=int(os.getenv("BENCH_FOLDERS", "5")),
+    files_per_folder=int(os.getenv("BENCH_FILES_PER_FOLDER", "20")),
+    file_size=int(os.getenv("BENCH_FILE_SIZE", "20000")),
+    latency=float(os.getenv("BENCH_DRIVE_LATENCY", "0.05")),
+)
+
+# Every Drive lookup in the server goes through these two names
+server.get_drive_service = lambda: drive
+drive_utils.get_drive_service = lambda: drive
+
+mcp = server.mcp
+
+
+@mcp.custom_route("/bench/stats", methods=["GET"])
+async def bench_stats(request):
+    return JSONResponse(drive.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8101)
+    args = parser.parse_args()
+    mcp.run(transport="http", host="127.0.0.1", port=args.port, show_banner=False, log_level="warning")
@@ -0,0 +1,124 @@
+"""
+Scripted OpenAI-compatible chat completions server for benchmarks.
+For a new user message it streams tool calls (list_files on a folder and get_file
+on one of its Google Docs, picked from the message text); once tool results are
+in the conversation it streams a short answer. Latency is configurable.
+GET /bench/stats returns the number of completions served.
+
+Usage: python fake_openai.py --port 8100
+"""
+import os
+import json
+import time
+import asyncio
+import zlib
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+
+# Seconds before the first chunk, and between streamed chunks
+LLM_LATENCY = float(os.getenv("BENCH_LLM_LATENCY", "0.3"))
+LLM_TOKEN_DELAY = float(os.getenv("BENCH_LLM_TOKEN_DELAY", "0.01"))
+
+# Must match the fake Drive layout (see fake_drive.FakeDrive)
+FOLDERS = int(os.getenv("BENCH_FOLDERS", "5"))
+FILES_PER_FOLDER = int(os.getenv("BENCH_FILES_PER_FOLDER", "20"))
+
+ANSWER = "Here is what I found in your Drive: the document covers the budget, the roadmap and next steps."
+
+app = FastAPI()
+stats = {"completions": 0, "tool_call_turns": 0, "answer_turns": 0}
+
+
+def _chunk(delta, finish_reason=None):
+    return {
+        "id": "chatcmpl-bench", "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": "bench", "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _tool_calls(message, tool_names):
+    """Tool calls for a user message: the same message always picks the same folder and file."""
+    seed = zlib.crc32(message.encode())
+    folder = seed % FOLDERS
+    file_index = (seed // FOLDERS) % max(1, FILES_PER_FOLDER // 2) * 2  # even indexes are Google Docs
+    calls = [
+        ("list_files", {"folder_name": f"Folder {folder}"}),
+        ("get_file", {"file_id": f"file-{folder}-{file_index}"}),
+    ]
+    return [(name, args) for name, args in calls if name in tool_names]
+
+
+def _script(body):
+    """The list of chunk deltas to stream back for a request body."""
+    messages = body["messages"]
+    tool_names = {t["function"]["name"] for t in body.get("tools") or []}
+    if messages[-1]["role"] == "user":
+        calls = _tool_calls(messages[-1]["content"] or "", tool_names)
+        if calls:
+            stats["tool_call_turns"] += 1
+            deltas = []
+            for i, (name, args) in enumerate(calls):
+                deltas.append({"tool_calls": [{"index": i, "id": f"call_{i}", "type": "function",
+                                               "function": {"name": name, "arguments": ""}}]})
+                deltas.append({"tool_calls": [{"index": i, "function": {"arguments": json.dumps(args)}}]})
+            return deltas, "tool_calls"
+    stats["answer_turns"] += 1
+    return [{"content": word} for word in ANSWER.split(" ")], "stop"
+
+
+def _usage(body, deltas):
+    prompt_chars = sum(len(json.dumps(m)) for m in body["messages"])
+    return {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(deltas), "total_tokens": prompt_chars // 4 + len(deltas)}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["completions"] += 1
+    deltas, finish_reason = _script(body)
+
+    if not body.get("stream"):
+        await asyncio.sleep(LLM_LATENCY)
+        content = "".join(d.get("content", "") + " " for d in deltas).strip() or None
+        return JSONResponse({
+            "id": "chatcmpl-bench", "object": "chat.completion", "created": int(time.time()), "model": "bench",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": _usage(body, deltas),
+        })
+
+    async def stream():
+        await asyncio.sleep(LLM_LATENCY)
+        yield f"data: {json.dumps(_chunk({'role': 'assistant'}))}\n\n"
+        for i, delta in enumerate(deltas):
+            if "content" in delta and i:
+                delta = {"content": " " + delta["content"]}
+            yield f"data: {json.dumps(_chunk(delta))}\n\n"
+            await asyncio.sleep(LLM_TOKEN_DELAY)
+        yield f"data: {json.dumps(_chunk({}, finish_reason))}\n\n"
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage_chunk = {**_chunk({}), "choices": [], "usage": _usage(body, deltas)}
+            yield f"data: {json.dumps(usage_chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+async def models():
+    # The backend lists models once on startup to open its connection
+    return {"object": "list", "data": [{"id": "bench", "object": "model", "created": 0, "owned_by": "bench"}]}
+
+
+@app.get("/bench/stats")
+async def bench_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,262 @@
+"""
+End-to-end benchmark: starts the fake OpenAI server, the real MCP server on a fake
+Drive and the real chat backend, runs concurrent /chat sessions against them and
+reports latency percentiles, throughput, memory and LLM/Drive call counts.
+Results are printed and saved as JSON so runs can be compared. Runs fully offline.
+
+Usage: python benchmark/run.py --sessions 20 --turns 3 --drive-latency 0.05
+"""
+import math
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+QUESTIONS = [
+    "Summarize the latest budget report",
+    "What does the roadmap say about the launch timeline?",
+    "List the files in my project folder and read the onboarding doc",
+    "Find the meeting notes about hiring",
+    "What are the main risks in the sales forecast?",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test the chat backend against local fakes.")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent chat sessions")
+    parser.add_argument("--turns", type=int, default=3, help="messages sent per session")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="seconds before the fake LLM's first chunk")
+    parser.add_argument("--llm-token-delay", type=float, default=0.01, help="seconds between streamed chunks")
+    parser.add_argument("--drive-latency", type=float, default=0.05, help="seconds per fake Drive call")
+    parser.add_argument("--folders", type=int, default=5)
+    parser.add_argument("--files-per-folder", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=20000, help="bytes of text per file")
+    parser.add_argument("--base-port", type=int, default=8100, help="fake OpenAI port; MCP and backend use the next two")
+    parser.add_argument("--output", help="results file (default: benchmark/results/bench-<time>.json)")
+    return parser.parse_args()
+
+
+def http_json(url, body=None, timeout=120):
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read())
+
+
+def http_text(url, timeout=10):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.read().decode()
+
+
+def wait_until_up(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Process for {url} exited with code {process.returncode}")
+        try:
+            http_text(url, timeout=2)
+            return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def rss_mb(pid, field="VmRSS"):
+    """Resident memory (or peak with field='VmHWM') of a process in MB, from /proc."""
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def metric_total(metrics_text, name):
+    """Sum of every sample of one metric in Prometheus text output."""
+    total = 0.0
+    for line in metrics_text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+def start_services(args, state_dir):
+    ports = {"openai": args.base_port, "mcp": args.base_port + 1, "backend": args.base_port + 2}
+    env = {
+        **os.environ,
+        "BENCH_LLM_LATENCY": str(args.llm_latency),
+        "BENCH_LLM_TOKEN_DELAY": str(args.llm_token_delay),
+        "BENCH_DRIVE_LATENCY": str(args.drive_latency),
+        "BENCH_FOLDERS": str(args.folders),
+        "BENCH_FILES_PER_FOLDER": str(args.files_per_folder),
+        "BENCH_FILE_SIZE": str(args.file_size),
+        # Keep the MCP server's local indexes and caches out of the repo
+        "DRIVE_INDEX_PATH": os.path.join(state_dir, "drive_index.db"),
+        "CONTENT_CACHE_DIR": os.path.join(state_dir, "content_cache"),
+        "CONTENT_INDEX_PATH": os.path.join(state_dir, "content_index.db"),
+        "SESSION_DB_PATH": os.path.join(state_dir, "sessions.db"),
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "MCP_SERVER_URL": f"http://127.0.0.1:{ports['mcp']}/mcp",
+    }
+    log_path = os.path.join(state_dir, "services.log")
+    log = open(log_path, "w")
+    processes = {}
+    try:
+        processes["openai"] = subprocess.Popen(
+            [sys.executable, "fake_openai.py", "--port", str(ports["openai"])],
+            cwd=BENCH_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        processes["mcp"] = subprocess.Popen(
+            [sys.executable, "fake_mcp_server.py", "--port", str(ports["mcp"])],
+            cwd=BENCH_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        wait_until_up(f"http://127.0.0.1:{ports['openai']}/bench/stats", processes["openai"])
+        wait_until_up(f"http://127.0.0.1:{ports['mcp']}/ready", processes["mcp"])
+        # The backend connects to the MCP server on startup, so it goes last
+        processes["backend"] = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(ports["backend"]),
+             "--log-level", "warning"],
+            cwd=os.path.join(REPO_DIR, "llm_backend"), env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+        # /ready answers 503 until the backend has its tool catalog and connections warm
+        wait_until_up(f"http://127.0.0.1:{ports['backend']}/ready", processes["backend"])
+    except Exception:
+        stop_services(processes)
+        print(f"Services failed to start, see {log_path}")
+        raise
+    return processes, ports
+
+
+def stop_services(processes):
+    for process in processes.values():
+        if process.poll() is None:
+            process.send_signal(signal.SIGINT)
+    for process in processes.values():
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def run_session(backend_url, session, turns):
+    """Send `turns` messages in one conversation; returns a list of (latency seconds, ok)."""
+    results = []
+    session_id = None
+    for turn in range(turns):
+        message = f"{QUESTIONS[(session + turn) % len(QUESTIONS)]} (session {session}, turn {turn})"
+        start = time.perf_counter()
+        try:
+            reply = http_json(f"{backend_url}/chat", {"message": message, "session_id": session_id})
+            session_id = reply["session_id"]
+            ok = not reply["reply"].lower().startswith(("error", "an unexpected error", "openai api error"))
+        except Exception as e:
+            print(f"Request failed: {e}")
+            ok = False
+        results.append((time.perf_counter() - start, ok))
+    return results
+
+
+def main():
+    args = parse_args()
+    state_dir = tempfile.mkdtemp(prefix="chat-bench-")
+    processes, ports = start_services(args, state_dir)
+    backend_url = f"http://127.0.0.1:{ports['backend']}"
+
+    # Sample memory while the load runs to catch the peak of every process
+    peak_rss = {name: 0.0 for name in processes}
+    done = threading.Event()
+
+    def sample_memory():
+        while not done.is_set():
+            for name, process in processes.items():
+                peak_rss[name] = max(peak_rss[name], rss_mb(process.pid) or 0.0)
+            done.wait(0.2)
+
+    sampler = threading.Thread(target=sample_memory, daemon=True)
+    try:
+        # One request first so start-up work isn't counted in the latencies
+        run_session(backend_url, -1, 1)
+        before = {
+            "openai": http_json(f"http://127.0.0.1:{ports['openai']}/bench/stats"),
+            "drive": http_json(f"http://127.0.0.1:{ports['mcp']}/bench/stats"),
+            "tool_calls": metric_total(http_text(f"{backend_url}/metrics"), "mcp_tool_call_seconds_count"),
+        }
+
+        sampler.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+            sessions = list(pool.map(lambda s: run_session(backend_url, s, args.turns), range(args.sessions)))
+        duration = time.perf_counter() - start
+        done.set()
+
+        openai_stats = http_json(f"http://127.0.0.1:{ports['openai']}/bench/stats")
+        drive_stats = http_json(f"http://127.0.0.1:{ports['mcp']}/bench/stats")
+        backend_metrics = http_text(f"{backend_url}/metrics")
+        memory = {
+            name: {"rss_mb": rss_mb(p.pid), "peak_rss_mb": max(peak_rss[name], rss_mb(p.pid, "VmHWM") or 0.0)}
+            for name, p in processes.items()
+        }
+    finally:
+        done.set()
+        stop_services(processes)
+
+    samples = [result for session in sessions for result in session]
+    latencies = [latency * 1000 for latency, _ in samples]
+    errors = sum(1 for _, ok in samples if not ok)
+    requests = len(samples)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "requests": requests,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "requests_per_second": round(requests / duration, 2) if duration else None,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "mean": round(sum(latencies) / requests, 1),
+            "max": round(max(latencies), 1),
+        },
+        "memory": memory,
+        "calls": {
+            "llm_completions": openai_stats["completions"] - before["openai"]["completions"],
+            "mcp_tool_calls": int(metric_total(backend_metrics, "mcp_tool_call_seconds_count") - before["tool_calls"]),
+            "drive_calls": drive_stats["calls"] - before["drive"]["calls"],
+            "drive_media_calls": drive_stats["media_calls"] - before["drive"]["media_calls"],
+        },
+    }
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as fh:
+        json.dump(results, fh, indent=2)
+    shutil.rmtree(state_dir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Token-aware compaction of the message list sent to the LLM.
+Keeps the system prompt and the most recent turns, shrinks large tool outputs
+and drops the oldest turns once the token budget is exceeded.
+"""
+import os
+import json
+
+# Max prompt tokens (approximate) sent with each completion
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "8000"))
+
+# Most recent messages that are never dropped
+HISTORY_KEEP_RECENT = int(os.getenv("HISTORY_KEEP_RECENT", "6"))
+
+# Older tool outputs are cut down to this many tokens when over budget
+TOOL_OUTPUT_TOKEN_LIMIT = int(os.getenv("TOOL_OUTPUT_TOKEN_LIMIT", "500"))
+
+# Rough average for English text with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+# Fixed per-message overhead (role, separators) in the chat format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def count_tokens(text):
+    """Approximate token count of a string."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message):
+    """Approximate token count of one chat message, including tool call arguments."""
+    tokens = MESSAGE_OVERHEAD_TOKENS + count_tokens(message.get("content") or "")
+    for tool_call in message.get("tool_calls") or []:
+        tokens += count_tokens(json.dumps(tool_call["function"]))
+    return tokens
+
+
+def _truncate_tool_output(message, max_tokens):
+    content = message.get("content") or ""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(content) <= max_chars:
+        return message
+    omitted = len(content) - max_chars
+    return {**message, "content": f"{content[:max_chars]}\n\n[... {omitted} characters omitted to save tokens]"}
+
+
+def _group_turns(messages):
+    """
+    Split messages into groups that must be kept or dropped together:
+    an assistant message with tool_calls plus the tool results that follow it.
+    """
+    groups = []
+    for message in messages:
+        if message.get("role") == "tool" and groups:
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+
+def compact_messages(messages, budget=HISTORY_TOKEN_BUDGET, keep_recent=HISTORY_KEEP_RECENT):
+    """
+    Return a copy of `messages` that fits in `budget` tokens where possible.
+    messages[0] is assumed to be the system prompt and is always kept, as is the
+    latest user message and everything after it.
+    """
+    total = sum(message_tokens(m) for m in messages)
+    if total <= budget or len(messages) <= 1:
+        return messages
+
+    system, rest = messages[0], list(messages[1:])
+    recent_start = max(0, len(rest) - keep_recent)
+
+    # 1. Shrink large tool outputs outside the most recent messages
+    for i in range(recent_start):
+        if rest[i].get("role") == "tool":
+            rest[i] = _truncate_tool_output(rest[i], TOOL_OUTPUT_TOKEN_LIMIT)
+    total = message_tokens(system) + sum(message_tokens(m) for m in rest)
+    if total <= budget:
+        return [system] + rest
+
+    # 2. Drop the oldest turns until the budget fits. The recent messages and the
+    #    current turn (latest user message onwards) are never dropped.
+    current_start = max((i for i, m in enumerate(rest) if m.get("role") == "user"), default=len(rest))
+    droppable = min(recent_start, current_start)
+    groups = _group_turns(rest)
+    dropped = 0
+    while groups and total > budget and dropped + len(groups[0]) <= droppable:
+        group = groups.pop(0)
+        total -= sum(message_tokens(m) for m in group)
+        dropped += len(group)
+
+    compacted = [system]
+    if dropped:
+        compacted.append({
+            "role": "system",
+            "content": f"[{dropped} earlier messages of this conversation were omitted to fit the context budget]"
+        })
+    for group in groups:
+        compacted.extend(group)
+
+    # 3. Still too large: shrink whatever tool outputs remain, including the current turn's
+    if total > budget:
+        compacted = [
+            _truncate_tool_output(m, TOOL_OUTPUT_TOKEN_LIMIT) if m.get("role") == "tool" else m
+            for m in compacted
+        ]
+    return compacted
@@ -1,21 +1,86 @@
 import os
 import json
+import time
 import uuid
+import asyncio
 import xml.etree.ElementTree as ET
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-from mcp_client import get_mcp_tools_for_openai, execute_mcp_tool
+from mcp_client import get_cached_mcp_tools, execute_mcp_tool, start_mcp_pool, close_mcp_pool, tool_catalog, get_drive_version, get_file_versions, MCP_SERVER_URL
+from session_store import create_session_store
+from history_compaction import compact_messages
+from response_cache import AnswerCache, conversation_key
+from metrics import (
+    span, track_cache, render, new_request_id, request_id_var, REQUEST_ID_HEADER,
+    LLM_FIRST_TOKEN_SECONDS, LLM_TOKENS, CHAT_ITERATIONS,
+)
 
 # Load environment variables
 load_dotenv()
 
+# Seconds between warmup attempts while the MCP server is unreachable
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "2"))
+
+# Set once warmup has finished; /ready returns 503 until then
+ready_event = asyncio.Event()
+
+
+async def warm_up():
+    """
+    Open the OpenAI connection and fill the tool catalog and Drive version caches
+    before the first chat request, retrying until the MCP server answers.
+    An unreachable OpenAI API is only logged: chats report it themselves.
+    """
+    start = time.perf_counter()
+    try:
+        await client.models.list()
+    except Exception as e:
+        print(f"Warmup: could not reach the OpenAI API: {e}")
+    while MCP_SERVER_URL:
+        await tool_catalog.refresh()
+        # A successful fetch counts even if the server has no tools
+        if tool_catalog.loaded:
+            break
+        await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+    await get_drive_version()
+    ready_event.set()
+    print(f"Warmup finished in {time.perf_counter() - start:.2f}s")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Open the shared MCP session pool once and reuse it across requests
+    await start_mcp_pool()
+    # Warm up in the background so /ready can report progress meanwhile
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    warmup_task.cancel()
+    await close_mcp_pool()
+    await client.close()
+    conversations.close()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+
+
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    """Tag each request with an ID (taken from X-Request-ID or generated) and echo it back."""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or new_request_id()
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    return response
+
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
@@ -24,7 +89,59 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is required")
 
-client = OpenAI(api_key=OPENAI_API_KEY)
+# LLM client settings (seconds / counts)
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# Max completions in flight at once for this process
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+
+# Shared async client: one connection pool reused by every request,
+# so completions never block the event loop
+client = AsyncOpenAI(
+    api_key=OPENAI_API_KEY,
+    timeout=OPENAI_TIMEOUT,
+    max_retries=OPENAI_MAX_RETRIES,
+)
+llm_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+
+async def stream_chat_completion(**kwargs):
+    """
+    Stream chat completion chunks, limited to OPENAI_MAX_CONCURRENCY concurrent calls.
+    The slot is held until the stream is fully consumed.
+    """
+    async with llm_semaphore:
+        start = time.perf_counter()
+        stream = await client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **kwargs
+        )
+        first = True
+        async for chunk in stream:
+            if first:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - start)
+                first = False
+            # With include_usage the last chunk carries token counts (and no choices)
+            if chunk.usage:
+                LLM_TOKENS.labels(kind="prompt").inc(chunk.usage.prompt_tokens)
+                LLM_TOKENS.labels(kind="completion").inc(chunk.usage.completion_tokens)
+            yield chunk
+
+# Max tool calls from a single model turn that run at the same time (per request)
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+
+
+async def execute_mcp_tool_limited(semaphore, tool_name, tool_args):
+    """Run an MCP tool under the request's concurrency cap; returns (tool_name, result)."""
+    async with semaphore:
+        return tool_name, await execute_mcp_tool(tool_name, tool_args)
+
+
+def _file_ids_read(tool_args):
+    """File IDs a tool call reads content from (the file_id / file_ids arguments)."""
+    ids = [tool_args.get("file_id")]
+    if isinstance(tool_args.get("file_ids"), list):
+        ids += tool_args["file_ids"]
+    return {f_id for f_id in ids if isinstance(f_id, str) and f_id}
 
 # Load system prompt
 def load_system_prompt():
@@ -40,8 +157,16 @@ def load_system_prompt():
 
 SYSTEM_PROMPT = load_system_prompt()
 
-# In-memory conversation storage
-conversations = {}
+# Conversation storage: in-memory by default, SQLite (SESSION_STORE=sqlite)
+# when several workers need to share sessions
+conversations = create_session_store()
+
+# Final answers for repeated questions (invalidated when Drive changes)
+answer_cache = AnswerCache()
+
+# Cache hit rates exported on /metrics
+track_cache("tool_catalog", tool_catalog.stats)
+track_cache("answers", answer_cache.stats)
 
 # Pydantic models for request/response validation
 class ChatMessage(BaseModel):
@@ -60,102 +185,264 @@ async def get_home(request: Request):
 async def new_chat():
     """Create a new chat session."""
     session_id = str(uuid.uuid4())
-    conversations[session_id] = []
+    await conversations.acreate(session_id)
     return JSONResponse({"session_id": session_id})
 
 
-@app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(chat: ChatMessage):
-    # Create or get existing session
-    session_id = chat.session_id or str(uuid.uuid4())
-    if session_id not in conversations:
-        conversations[session_id] = []
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 once connections are open and caches are warm, 503 before."""
+    return JSONResponse({"ready": ready_event.is_set()}, status_code=200 if ready_event.is_set() else 503)
+
+
+@app.get("/admin/tools/stats")
+async def tool_cache_stats():
+    """Hit/miss counters for the MCP tool catalog cache."""
+    return JSONResponse(tool_catalog.stats())
+
+
+@app.get("/admin/sessions/stats")
+async def session_stats():
+    """Size and eviction counters for the conversation store."""
+    return JSONResponse(await conversations.astats())
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms, token counts and cache hit rates."""
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+
+@app.get("/admin/answers/stats")
+async def answer_cache_stats():
+    """Hit/miss counters for the answer cache."""
+    return JSONResponse(answer_cache.stats())
+
+
+@app.post("/admin/answers/clear")
+async def clear_answer_cache():
+    """Drop every cached answer."""
+    answer_cache.clear()
+    return JSONResponse(answer_cache.stats())
 
-    # Get MCP tools and convert to OpenAI format
-    # This discovers all available tools from the MCP server dynamically
-    mcp_tools = await get_mcp_tools_for_openai()
+
+@app.post("/admin/tools/refresh")
+async def refresh_tool_cache():
+    """Refetch the MCP tool catalog immediately."""
+    tools = await tool_catalog.refresh()
+    return JSONResponse({"tools": [t["function"]["name"] for t in tools], **tool_catalog.stats()})
+
+
+async def run_chat_turn(session_id: str, user_message: str):
+    """
+    Run one chat turn (LLM + MCP tool loop) and yield events as they happen:
+      {"type": "token", "content": ...}          model text as it streams in
+      {"type": "tool_start", "name": ..., "arguments": ...}
+      {"type": "tool_end", "name": ...}
+      {"type": "done", "reply": ...}              final reply (or error message)
+    """
+    if not await conversations.acontains(session_id):
+        await conversations.acreate(session_id)
+
+    # Repeated question: answer from the cache without calling OpenAI or Drive
+    cache_key = conversation_key(await conversations.aget(session_id), user_message)
+    cached_reply = await answer_cache.get(cache_key, get_drive_version, get_file_versions)
+    if cached_reply is not None:
+        await conversations.aappend(session_id, {"role": "user", "content": user_message})
+        await conversations.aappend(session_id, {"role": "assistant", "content": cached_reply})
+        yield {"type": "token", "content": cached_reply}
+        yield {"type": "done", "reply": cached_reply}
+        return
+
+    # Get MCP tools in OpenAI format
+    # Served from the tool catalog cache; only refetched when stale or changed
+    with span("tool_discovery"):
+        mcp_tools = await get_cached_mcp_tools()
 
     # Build conversation history
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    messages.extend(conversations[session_id])
-    messages.append({"role": "user", "content": chat.message})
+    messages.extend(await conversations.aget(session_id))
+    messages.append({"role": "user", "content": user_message})
 
     # Save user message to conversation history
-    conversations[session_id].append({"role": "user", "content": chat.message})
+    await conversations.aappend(session_id, {"role": "user", "content": user_message})
 
     # Loop to handle tool calls (AI might call tools multiple times)
     # Max 5 iterations to prevent infinite loops
     max_iterations = 5
     iteration = 0
-    
+
+    # Caps how many tool calls of this request run at the same time
+    tool_semaphore = asyncio.Semaphore(TOOL_CALL_CONCURRENCY)
+
+    # Drive version seen before the first tool call (for caching the final answer)
+    used_tools = False
+    drive_version = None
+    # IDs of files whose content the tools read (their versions are recorded with the answer)
+    read_file_ids = set()
+
     try:
         while iteration < max_iterations:
             iteration += 1
-            
-            # Call OpenAI API with tools available
+            CHAT_ITERATIONS.inc()
+
+            with span("history_compaction"):
+                prompt_messages = compact_messages(messages)
+
+            # Call OpenAI API with tools available, streaming tokens as they arrive
+            content_parts = []
+            tool_calls = {}  # index -> tool call assembled from streamed deltas
             try:
-                response = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=messages,
-                    tools=mcp_tools if mcp_tools else None,  
-                    tool_choice="auto" if mcp_tools else None,  # Let AI decide when to use tools
-                    max_tokens=500,
-                )
+                with span("llm_completion"):
+                    async for chunk in stream_chat_completion(
+                        model="gpt-4o-mini",
+                        messages=prompt_messages,
+                        tools=mcp_tools if mcp_tools else None,
+                        tool_choice="auto" if mcp_tools else None,  # Let AI decide when to use tools
+                        max_tokens=500,
+                    ):
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            content_parts.append(delta.content)
+                            yield {"type": "token", "content": delta.content}
+                        for tc in delta.tool_calls or []:
+                            entry = tool_calls.setdefault(tc.index, {
+                                "id": None,
+                                "type": "function",
+                                "function": {"name": "", "arguments": ""}
+                            })
+                            if tc.id:
+                                entry["id"] = tc.id
+                            if tc.function and tc.function.name:
+                                entry["function"]["name"] += tc.function.name
+                            if tc.function and tc.function.arguments:
+                                entry["function"]["arguments"] += tc.function.arguments
             except Exception as e:
                 error_msg = f"OpenAI API error: {str(e)}"
-                conversations[session_id].append({"role": "assistant", "content": error_msg})
-                return ChatResponse(reply=error_msg, session_id=session_id)
+                await conversations.aappend(session_id, {"role": "assistant", "content": error_msg})
+                yield {"type": "done", "reply": error_msg}
+                return
+
+            content = "".join(content_parts)
+            tool_calls = [tool_calls[i] for i in sorted(tool_calls)]
 
-            response_message = response.choices[0].message
-            
             # Add assistant's response to messages ( conversation flow)
-            messages.append(response_message)
+            assistant_message = {"role": "assistant", "content": content or None}
+            if tool_calls:
+                assistant_message["tool_calls"] = tool_calls
+            messages.append(assistant_message)
 
             # Check if the AI wants to call a tool
-            if response_message.tool_calls:
-                for tool_call in response_message.tool_calls:
-                    tool_name = tool_call.function.name
+            if tool_calls:
+                if not used_tools:
+                    used_tools = True
+                    drive_version = await get_drive_version()
+
+                # Start every tool call of this turn concurrently (capped by tool_semaphore)
+                # Each entry is a running task, or an error string if the arguments were invalid
+                tool_tasks = []
+                for tool_call in tool_calls:
+                    tool_name = tool_call["function"]["name"]
                     try:
-                        tool_args = json.loads(tool_call.function.arguments)
+                        tool_args = json.loads(tool_call["function"]["arguments"] or "{}")
                     except json.JSONDecodeError as e:
-                        tool_result = f"Error parsing tool arguments: {str(e)}"
-                        messages.append({
-                            "role": "tool",
-                            "tool_call_id": tool_call.id,
-                            "name": tool_name,
-                            "content": tool_result
-                        })
+                        tool_tasks.append(f"Error parsing tool arguments: {str(e)}")
                         continue
-                    
+
+                    read_file_ids.update(_file_ids_read(tool_args))
+
                     # Execute the MCP tool
-                    tool_result = await execute_mcp_tool(tool_name, tool_args)
-                    
-                    # Add tool result to messages so AI can use it
+                    yield {"type": "tool_start", "name": tool_name, "arguments": tool_args}
+                    tool_tasks.append(asyncio.create_task(
+                        execute_mcp_tool_limited(tool_semaphore, tool_name, tool_args)
+                    ))
+
+                # Report each tool as soon as it finishes
+                running = [task for task in tool_tasks if not isinstance(task, str)]
+                try:
+                    with span("tool_calls"):
+                        for finished in asyncio.as_completed(running):
+                            tool_name, _ = await finished
+                            yield {"type": "tool_end", "name": tool_name}
+                finally:
+                    for task in running:
+                        if not task.done():
+                            task.cancel()
+
+                # Add tool results to messages in the original tool_call order so AI can use them
+                for tool_call, task in zip(tool_calls, tool_tasks):
+                    if isinstance(task, str):
+                        tool_result = task
+                    else:
+                        _, tool_result = task.result()
                     messages.append({
                         "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "name": tool_name,
+                        "tool_call_id": tool_call["id"],
+                        "name": tool_call["function"]["name"],
                         "content": tool_result
                     })
-                
-                # Continue the loop 
+
+                # Continue the loop
                 continue
             else:
                 # No tool calls
-                ai_reply = response_message.content
-                
+                ai_reply = content
+
                 # Save assistant message to conversation history
-                conversations[session_id].append({"role": "assistant", "content": ai_reply})
-                
-                return ChatResponse(reply=ai_reply, session_id=session_id)
+                await conversations.aappend(session_id, {"role": "assistant", "content": ai_reply})
+                file_versions = await get_file_versions(sorted(read_file_ids)) if read_file_ids else None
+                # Only cache if we can tell when every file it read changes
+                if not read_file_ids or (file_versions is not None and set(file_versions) == read_file_ids):
+                    answer_cache.put(cache_key, ai_reply, used_tools, drive_version, file_versions)
+
+                yield {"type": "done", "reply": ai_reply}
+                return
 
         # If we hit max iterations, raise an error
         raise Exception("MAX_ITERATIONS")
-    
+
     except Exception as e:
         if str(e) == "MAX_ITERATIONS":
             error_msg = "ERROR: MAX ITERATIONS REACHED"
         else:
             error_msg = f"An unexpected error occurred: {str(e)}"
-        conversations[session_id].append({"role": "assistant", "content": error_msg})
-        return ChatResponse(reply=error_msg, session_id=session_id)
+        await conversations.aappend(session_id, {"role": "assistant", "content": error_msg})
+        yield {"type": "done", "reply": error_msg}
+
+
+@app.post("/chat", response_model=ChatResponse)
+async def chat_endpoint(chat: ChatMessage):
+    # Create or get existing session
+    session_id = chat.session_id or str(uuid.uuid4())
+
+    ai_reply = ""
+    with span("chat_turn"):
+        async for event in run_chat_turn(session_id, chat.message):
+            if event["type"] == "done":
+                ai_reply = event["reply"]
+
+    return ChatResponse(reply=ai_reply, session_id=session_id)
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(chat: ChatMessage):
+    """
+    Same as /chat, but streams Server-Sent Events: the session id first,
+    then tokens and tool start/finish events, then the final reply.
+    """
+    session_id = chat.session_id or str(uuid.uuid4())
+
+    async def event_stream():
+        yield f"data: {json.dumps({'type': 'session', 'session_id': session_id})}\n\n"
+        with span("chat_turn"):
+            async for event in run_chat_turn(session_id, chat.message):
+                yield f"data: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
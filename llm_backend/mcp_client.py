@@ -2,42 +2,271 @@
 MCP Client utilities for connecting to MCP servers and converting tools to OpenAI format.
 """
 import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from fastmcp import Client
+from fastmcp.client.messages import MessageHandler
 from dotenv import load_dotenv
+from metrics import TOOL_CALL_SECONDS, current_request_id
 
 load_dotenv()
 
 # MCP server URL (HTTP transport - server runs separately)
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL")
 
+# Number of long-lived MCP sessions shared across requests
+MCP_POOL_SIZE = int(os.getenv("MCP_POOL_SIZE", "4"))
+
+# Sessions idle longer than this (seconds) are pinged before being handed out
+MCP_HEALTH_CHECK_INTERVAL = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL", "30"))
+
+# How long (seconds) the converted tool catalog is served from cache
+MCP_TOOL_CACHE_TTL = float(os.getenv("MCP_TOOL_CACHE_TTL", "300"))
+
+# After a failed refetch, how long (seconds) the last good catalog is served before trying again
+MCP_TOOL_RETRY_INTERVAL = float(os.getenv("MCP_TOOL_RETRY_INTERVAL", "5"))
+
+# How long (seconds) the Drive version read from the MCP server is reused
+DRIVE_VERSION_CHECK_INTERVAL = float(os.getenv("DRIVE_VERSION_CHECK_INTERVAL", "5"))
+
 if not MCP_SERVER_URL:
     print("Warning: MCP_SERVER_URL not set. MCP tools will not be available.")
 
 
+class ToolCatalogCache:
+    """
+    Cache of the MCP tool list, already converted to OpenAI function format.
+    Refreshed when the TTL expires, when the server sends tools/list_changed,
+    or when invalidated explicitly (admin endpoint). If a refetch fails, the last
+    good catalog keeps being served and the next attempt waits MCP_TOOL_RETRY_INTERVAL.
+    """
+
+    def __init__(self, ttl=MCP_TOOL_CACHE_TTL, retry_interval=MCP_TOOL_RETRY_INTERVAL):
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self._tools = None
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self):
+        return self._tools is not None and time.monotonic() < self._expires_at
+
+    @property
+    def loaded(self):
+        """True once a fetch has succeeded (even if the server has no tools)."""
+        return self._tools is not None
+
+    def _is_backing_off(self):
+        return time.monotonic() < self._retry_at
+
+    async def get(self):
+        """Return cached tools, fetching them from the MCP server when stale."""
+        if self._is_fresh() or self._is_backing_off():
+            self.hits += 1
+            return self._tools or []
+
+        # Only one request refetches; the others wait and reuse its result
+        async with self._lock:
+            if self._is_fresh() or self._is_backing_off():
+                self.hits += 1
+                return self._tools or []
+            self.misses += 1
+            try:
+                tools = await fetch_mcp_tools_for_openai()
+            except Exception as e:
+                # Keep serving the last good catalog (if any) and wait before retrying
+                print(f"Error getting MCP tools, serving the cached catalog: {e}")
+                self.failures += 1
+                self._retry_at = time.monotonic() + self.retry_interval
+                return self._tools or []
+            self._tools = tools
+            self._expires_at = time.monotonic() + self.ttl
+            self._retry_at = 0.0
+            return tools
+
+    def invalidate(self):
+        """Drop the cached catalog so the next get() refetches it."""
+        self._expires_at = 0.0
+        self._retry_at = 0.0
+
+    async def refresh(self):
+        """Force a refetch of the tool catalog."""
+        self.invalidate()
+        return await self.get()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "failures": self.failures,
+            "cached_tools": len(self._tools) if self._tools else 0,
+            "fresh": self._is_fresh(),
+            "ttl_seconds": self.ttl,
+        }
+
+
+# Shared tool catalog, used by chat_endpoint in main.py
+tool_catalog = ToolCatalogCache()
+
+
+class ToolListChangedHandler(MessageHandler):
+    """Invalidates the tool catalog when the MCP server reports a tool list change."""
+
+    async def on_tool_list_changed(self, message):
+        tool_catalog.invalidate()
+
+
+class MCPClientPool:
+    """
+    Pool of persistent MCP client sessions.
+    Each session is connected once and reused, so tool listing and tool calls
+    skip the connect/initialize handshake. Broken sessions are reconnected.
+    """
+
+    def __init__(self, url, size=MCP_POOL_SIZE, health_check_interval=MCP_HEALTH_CHECK_INTERVAL):
+        self.url = url
+        self.size = max(1, size)
+        self.health_check_interval = health_check_interval
+        self._idle = asyncio.Queue()
+        self._clients = []
+        self._last_used = {}
+        self._closed = False
+
+    async def start(self):
+        """Create and connect the sessions concurrently. Connection errors are retried lazily on acquire."""
+        clients = [Client(self.url, message_handler=ToolListChangedHandler()) for _ in range(self.size)]
+        self._clients.extend(clients)
+        results = await asyncio.gather(*(self._connect(client) for client in clients), return_exceptions=True)
+        for client, result in zip(clients, results):
+            if isinstance(result, Exception):
+                print(f"Error connecting to MCP server at {self.url}: {result}")
+            self._idle.put_nowait(client)
+
+    async def close(self):
+        """Close every session in the pool."""
+        self._closed = True
+        for client in self._clients:
+            try:
+                await client.close()
+            except Exception as e:
+                print(f"Error closing MCP session: {e}")
+        self._clients = []
+        self._last_used = {}
+
+    async def _connect(self, client):
+        await client.__aenter__()
+        self._last_used[id(client)] = time.monotonic()
+
+    async def _reconnect(self, client):
+        try:
+            await client.close()
+        except Exception:
+            pass
+        await self._connect(client)
+
+    async def _ensure_healthy(self, client):
+        """Connect the session if needed and ping it if it has been idle for a while."""
+        if not client.is_connected():
+            await self._connect(client)
+            return
+        idle_for = time.monotonic() - self._last_used.get(id(client), 0)
+        if idle_for >= self.health_check_interval:
+            try:
+                await client.ping()
+            except Exception:
+                await self._reconnect(client)
+
+    @asynccontextmanager
+    async def session(self):
+        """Borrow a connected session; it is returned to the pool afterwards."""
+        if self._closed:
+            raise ConnectionError("MCP client pool is closed")
+        client = await self._idle.get()
+        try:
+            await self._ensure_healthy(client)
+            yield client
+        finally:
+            self._last_used[id(client)] = time.monotonic()
+            self._idle.put_nowait(client)
+
+    async def run(self, operation):
+        """
+        Run `operation(client)` on a pooled session.
+        If the session fails mid-call it is reconnected and the call retried once.
+        """
+        async with self.session() as client:
+            try:
+                return await operation(client)
+            except (ConnectionError, OSError):
+                await self._reconnect(client)
+                return await operation(client)
+
+
+# Shared pool, created by the FastAPI lifespan in main.py
+mcp_pool = None
+
+
+async def start_mcp_pool():
+    """Create the shared MCP session pool (no-op if MCP is not configured)."""
+    global mcp_pool
+    if not MCP_SERVER_URL or mcp_pool is not None:
+        return
+    mcp_pool = MCPClientPool(MCP_SERVER_URL)
+    await mcp_pool.start()
+
+
+async def close_mcp_pool():
+    """Close the shared MCP session pool."""
+    global mcp_pool
+    if mcp_pool is not None:
+        await mcp_pool.close()
+        mcp_pool = None
+
+
+async def _run_mcp(operation):
+    # Fall back to a one-off session if the pool has not been started
+    if mcp_pool is None:
+        async with Client(MCP_SERVER_URL) as mcp_client:
+            return await operation(mcp_client)
+    return await mcp_pool.run(operation)
+
+
+async def fetch_mcp_tools_for_openai():
+    """Tool list from the MCP server in OpenAI format; raises if the server can't be reached."""
+    tools = await _run_mcp(lambda mcp_client: mcp_client.list_tools())
+    openai_tools = []
+    for tool in tools:
+        # Convert MCP tool to OpenAI function format
+        openai_tool = {
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": tool.description or f"Tool: {tool.name}",
+                "parameters": tool.inputSchema if hasattr(tool, 'inputSchema') and tool.inputSchema else {
+                    "type": "object",
+                    "properties": {},
+                    "required": []
+                }
+            }
+        }
+        openai_tools.append(openai_tool)
+    return openai_tools
+
+
 async def get_mcp_tools_for_openai():
     if not MCP_SERVER_URL:
         return []
-    
+
     try:
-        async with Client(MCP_SERVER_URL) as mcp_client:
-            tools = await mcp_client.list_tools()
-            openai_tools = []
-            for tool in tools:
-                # Convert MCP tool to OpenAI function format
-                openai_tool = {
-                    "type": "function",
-                    "function": {
-                        "name": tool.name,
-                        "description": tool.description or f"Tool: {tool.name}",
-                        "parameters": tool.inputSchema if hasattr(tool, 'inputSchema') and tool.inputSchema else {
-                            "type": "object",
-                            "properties": {},
-                            "required": []
-                        }
-                    }
-                }
-                openai_tools.append(openai_tool)
-            return openai_tools
+        return await fetch_mcp_tools_for_openai()
     except ConnectionError as e:
         print(f"Error connecting to MCP server at {MCP_SERVER_URL}: {e}")
         return []
@@ -46,19 +275,70 @@ async def get_mcp_tools_for_openai():
         return []
 
 
+async def get_cached_mcp_tools():
+    """Tool list in OpenAI format, served from the shared catalog cache."""
+    if not MCP_SERVER_URL:
+        return []
+    return await tool_catalog.get()
+
+
+_drive_version = {"value": None, "checked_at": 0.0}
+
+
+async def get_drive_version():
+    """
+    Version of the Drive data behind the MCP server (changes whenever Drive does),
+    or None if the server can't tell. Re-read at most every DRIVE_VERSION_CHECK_INTERVAL seconds.
+    """
+    if not MCP_SERVER_URL:
+        return None
+    if time.monotonic() - _drive_version["checked_at"] < DRIVE_VERSION_CHECK_INTERVAL:
+        return _drive_version["value"]
+    try:
+        contents = await _run_mcp(lambda mcp_client: mcp_client.read_resource("drive-state://version"))
+        version = json.loads(contents[0].text).get("version")
+    except Exception as e:
+        print(f"Error reading Drive version: {e}")
+        version = None
+    _drive_version.update(value=version, checked_at=time.monotonic())
+    return version
+
+
+async def get_file_versions(file_ids):
+    """
+    Current version of each file ID (dict of ID -> version; unreadable files are left
+    out), or None if the server can't be reached. Always read live, never cached here.
+    """
+    if not MCP_SERVER_URL or not file_ids:
+        return None
+    uri = "drive-state://files/" + ",".join(sorted(set(file_ids)))
+    try:
+        contents = await _run_mcp(lambda mcp_client: mcp_client.read_resource(uri))
+        return json.loads(contents[0].text).get("versions", {})
+    except Exception as e:
+        print(f"Error reading file versions: {e}")
+        return None
+
+
 async def execute_mcp_tool(tool_name: str, parameters: dict):
     if not MCP_SERVER_URL:
         return f"Error: MCP server not configured. Cannot call tool {tool_name}"
-    
+
+    # Forward the chat request ID so the MCP server can tag its own timings with it
+    request_id = current_request_id()
+    meta = {"request_id": request_id} if request_id else None
+    status = "error"
+    start = time.perf_counter()
     try:
-        async with Client(MCP_SERVER_URL) as mcp_client:
-            result = await mcp_client.call_tool(tool_name, parameters)
-            if result.content and len(result.content) > 0:
-                return result.content[0].text
-            else:
-                return f"Tool {tool_name} returned empty result"
+        result = await _run_mcp(lambda mcp_client: mcp_client.call_tool(tool_name, parameters, meta=meta))
+        status = "ok"
+        if result.content and len(result.content) > 0:
+            return result.content[0].text
+        else:
+            return f"Tool {tool_name} returned empty result"
     except ConnectionError as e:
         return f"Error: Could not connect to MCP server. {str(e)}"
     except Exception as e:
         return f"Error calling tool {tool_name}: {str(e)}"
-
+    finally:
+        TOOL_CALL_SECONDS.labels(tool=tool_name, status=status).observe(time.perf_counter() - start)
@@ -0,0 +1,74 @@
+"""
+Prometheus metrics and lightweight tracing for the chat backend.
+span() times one stage of a chat turn into a histogram; with TRACE_SPANS on it
+also prints the timing tagged with the request ID, which is forwarded to the
+MCP server so both sides of a slow request can be matched up.
+"""
+import os
+import time
+import uuid
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Print every span with its request ID (in addition to recording the histogram)
+TRACE_SPANS = os.getenv("TRACE_SPANS", "false").lower() in ("1", "true", "yes")
+
+# Header carrying the request ID in and out of the backend
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Request ID of the chat request being handled (None outside a request)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram(
+    "chat_stage_seconds", "Time spent in each stage of a chat turn", ["stage"], buckets=LATENCY_BUCKETS
+)
+TOOL_CALL_SECONDS = Histogram(
+    "mcp_tool_call_seconds", "MCP tool call round trip time seen by the backend", ["tool", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+LLM_FIRST_TOKEN_SECONDS = Histogram(
+    "llm_time_to_first_token_seconds", "Time from sending a completion request to its first chunk",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "Tokens used by chat completions", ["kind"])
+CHAT_ITERATIONS = Counter("chat_llm_iterations_total", "Completion round trips made by chat turns")
+
+CACHE_HITS = Gauge("cache_hits", "Cache hits since start", ["cache"])
+CACHE_MISSES = Gauge("cache_misses", "Cache misses since start", ["cache"])
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Cache hits / lookups since start", ["cache"])
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as `stage` in chat_stage_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        if TRACE_SPANS:
+            print(f"[{current_request_id() or '-'}] {stage} {elapsed * 1000:.1f}ms")
+
+
+def track_cache(name, stats):
+    """Export hits/misses/hit_rate from a cache's stats() function, read at scrape time."""
+    CACHE_HITS.labels(cache=name).set_function(lambda: stats()["hits"])
+    CACHE_MISSES.labels(cache=name).set_function(lambda: stats()["misses"])
+    CACHE_HIT_RATIO.labels(cache=name).set_function(lambda: stats()["hit_rate"])
+
+
+def render():
+    """(body, content type) for a Prometheus scrape."""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,115 @@
+"""
+Cache of final chat answers for repeated questions.
+Keyed by the normalized conversation so far (earlier user/assistant messages plus
+the new question), so "List files in Reports" and "list files in reports?" at
+the start of two sessions share one answer. Answers that used Drive tools also
+record the Drive version they were built from, plus the version of every file whose
+content they read, and are dropped once either changes.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+from collections import OrderedDict
+
+# Serve repeated questions from the answer cache
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Seconds a cached answer stays valid
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "300"))
+
+# Max number of cached answers
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))
+
+
+def normalize(text):
+    """Lowercase, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", text or "").strip().lower().rstrip(" .?!")
+
+
+def conversation_key(history, user_message):
+    """Cache key for a new user message given the session's earlier messages."""
+    turns = [
+        (m["role"], normalize(m.get("content")))
+        for m in history
+        if m.get("role") in ("user", "assistant") and m.get("content")
+    ]
+    turns.append(("user", normalize(user_message)))
+    return hashlib.sha256(json.dumps(turns).encode()).hexdigest()
+
+
+class AnswerCache:
+    """LRU cache of final answers with a TTL and Drive-version invalidation."""
+
+    def __init__(self, ttl=ANSWER_CACHE_TTL, max_entries=ANSWER_CACHE_MAX_ENTRIES, enabled=ANSWER_CACHE_ENABLED):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # key -> {"answer", "drive_version", "file_versions", "stored_at"}
+
+    async def get(self, key, drive_version, file_versions=None):
+        """
+        Cached answer for `key`, or None. `drive_version` is an async callable returning
+        the current Drive version; it's only called for answers that used Drive tools.
+        `file_versions(file_ids)` returns the current versions of files (dict, or None
+        if unknown); it's only called for answers that read file content.
+        """
+        if not self.enabled:
+            return None
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry["stored_at"] > self.ttl:
+            self._entries.pop(key, None)
+            entry = None
+        if entry is not None and entry["drive_version"] is not None and await drive_version() != entry["drive_version"]:
+            # Drive changed since this answer was built
+            self._entries.pop(key, None)
+            self.invalidations += 1
+            entry = None
+        if entry is not None and entry["file_versions"]:
+            current = await file_versions(list(entry["file_versions"])) if file_versions else None
+            if current != entry["file_versions"]:
+                # A file the answer read was edited (or can't be checked)
+                self._entries.pop(key, None)
+                self.invalidations += 1
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry["answer"]
+
+    def put(self, key, answer, used_tools, drive_version=None, file_versions=None):
+        """
+        Store an answer; answers built from Drive need a known version to be cacheable.
+        `file_versions` maps the IDs of files the answer read to their versions.
+        """
+        if not self.enabled or (used_tools and drive_version is None):
+            return
+        self._entries[key] = {
+            "answer": answer,
+            "drive_version": drive_version if used_tools else None,
+            "file_versions": file_versions or None,
+            "stored_at": time.monotonic(),
+        }
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / total if total else 0.0,
+            "ttl_seconds": self.ttl,
+        }
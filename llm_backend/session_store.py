@@ -0,0 +1,275 @@
+"""
+Conversation storage backends.
+SessionStore keeps sessions in process memory (default). SQLiteSessionStore keeps them
+in a WAL-mode SQLite file so several uvicorn workers on one host share sessions.
+Both evict sessions that have been idle too long.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# Which backend create_session_store() builds: "memory" or "sqlite"
+SESSION_STORE = os.getenv("SESSION_STORE", "memory")
+
+# SQLite database file used when SESSION_STORE=sqlite
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+
+# Max number of sessions kept in memory
+SESSION_MAX_COUNT = int(os.getenv("SESSION_MAX_COUNT", "1000"))
+
+# Sessions untouched for this many seconds are dropped
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+
+# Ceiling (bytes of serialized messages) for all sessions together
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", str(50 * 1024 * 1024)))
+
+
+def _message_size(message):
+    return len(json.dumps(message, default=str))
+
+
+class ConversationStore(ABC):
+    """
+    Interface every conversation backend implements (session_id -> list of chat messages).
+    Async code calls the a*-prefixed methods: backends whose calls block on I/O set
+    `blocking` and those run on a worker thread instead of the event loop.
+    """
+
+    # True when calls can block (disk, locks); the async methods then use a thread
+    blocking = False
+
+    @abstractmethod
+    def __contains__(self, session_id):
+        """True if the session exists (and hasn't been evicted)."""
+
+    @abstractmethod
+    def create(self, session_id):
+        """Start an empty session (resets it if it already exists)."""
+
+    @abstractmethod
+    def get(self, session_id):
+        """Return the session's messages, creating the session if needed."""
+
+    @abstractmethod
+    def append(self, session_id, message):
+        """Add a message to the end of the session's history."""
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+    async def _run(self, fn, *args):
+        if self.blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def acontains(self, session_id):
+        return await self._run(self.__contains__, session_id)
+
+    async def acreate(self, session_id):
+        return await self._run(self.create, session_id)
+
+    async def aget(self, session_id):
+        return await self._run(self.get, session_id)
+
+    async def aappend(self, session_id, message):
+        return await self._run(self.append, session_id, message)
+
+    async def astats(self):
+        return await self._run(self.stats)
+
+
+class SessionStore(ConversationStore):
+    """In-memory store, bounded with LRU + idle-TTL eviction and a byte ceiling."""
+
+    def __init__(self, max_sessions=SESSION_MAX_COUNT, idle_ttl=SESSION_IDLE_TTL, max_bytes=SESSION_MAX_BYTES):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._sessions = OrderedDict()  # session_id -> {"messages", "size", "last_access"}
+        self._total_bytes = 0
+
+    def __contains__(self, session_id):
+        self._evict_idle()
+        return session_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self, session_id):
+        """Start an empty session (resets it if it already exists)."""
+        self._drop(session_id)
+        self._sessions[session_id] = {"messages": [], "size": 0, "last_access": time.monotonic()}
+        self._evict()
+
+    def get(self, session_id):
+        """Return a copy of the session's messages, creating the session if needed."""
+        session = self._touch(session_id)
+        return list(session["messages"])
+
+    def append(self, session_id, message):
+        """Add a message to the end of the session's history."""
+        session = self._touch(session_id)
+        size = _message_size(message)
+        session["messages"].append(message)
+        session["size"] += size
+        self._total_bytes += size
+        self._evict(keep=session_id)
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "bytes": self._total_bytes,
+            "evictions": self.evictions,
+            "max_sessions": self.max_sessions,
+            "max_bytes": self.max_bytes,
+        }
+
+    def _touch(self, session_id):
+        if session_id not in self._sessions:
+            self.create(session_id)
+        session = self._sessions[session_id]
+        session["last_access"] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id):
+        session = self._sessions.pop(session_id, None)
+        if session is not None:
+            self._total_bytes -= session["size"]
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        # Oldest sessions are at the front, stop at the first one still active
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if session["last_access"] >= cutoff:
+                break
+            self._drop(session_id)
+            self.evictions += 1
+
+    def _evict(self, keep=None):
+        self._evict_idle()
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._total_bytes > self.max_bytes):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                # Never evict the session being written to; move on to the next oldest
+                if len(self._sessions) == 1:
+                    break
+                self._sessions.move_to_end(session_id)
+                continue
+            self._drop(session_id)
+            self.evictions += 1
+
+
+class SQLiteSessionStore(ConversationStore):
+    """
+    Store backed by a SQLite database in WAL mode, shareable by several processes on one host.
+    Messages are stored one row each, so a turn only inserts its new messages.
+    Writes can wait up to busy_timeout for other workers, so async callers go through
+    a worker thread (the connection is shared between threads under a lock).
+    """
+
+    blocking = True
+
+    def __init__(self, path=SESSION_DB_PATH, idle_ttl=SESSION_IDLE_TTL):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self.evictions = 0
+        self._last_cleanup = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                last_access REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                content TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+        """)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            self._evict_idle()
+            row = self._conn.execute("SELECT 1 FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def create(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, last_access) VALUES (?, ?)",
+                (session_id, time.time()),
+            )
+
+    def get(self, session_id):
+        with self._lock:
+            with self._conn:
+                self._touch(session_id)
+            rows = self._conn.execute(
+                "SELECT content FROM messages WHERE session_id = ? ORDER BY id", (session_id,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def append(self, session_id, message):
+        with self._lock, self._conn:
+            self._touch(session_id)
+            self._conn.execute(
+                "INSERT INTO messages (session_id, content) VALUES (?, ?)",
+                (session_id, json.dumps(message, default=str)),
+            )
+
+    def stats(self):
+        with self._lock:
+            sessions = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            messages = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+        return {"sessions": sessions, "messages": messages, "evictions": self.evictions, "path": self.path}
+
+    def close(self):
+        self._conn.close()
+
+    def _touch(self, session_id):
+        self._conn.execute(
+            "INSERT INTO sessions (id, last_access) VALUES (?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET last_access = excluded.last_access",
+            (session_id, time.time()),
+        )
+
+    def _evict_idle(self):
+        # Cleanup scans the table, so run it at most once a minute
+        now = time.time()
+        if now - self._last_cleanup < 60:
+            return
+        self._last_cleanup = now
+        cutoff = now - self.idle_ttl
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE last_access < ?)",
+                (cutoff,),
+            )
+            deleted = self._conn.execute("DELETE FROM sessions WHERE last_access < ?", (cutoff,)).rowcount
+        self.evictions += deleted
+
+
+def create_session_store():
+    """Build the conversation store selected by SESSION_STORE."""
+    if SESSION_STORE == "sqlite":
+        return SQLiteSessionStore()
+    if SESSION_STORE != "memory":
+        print(f"Warning: unknown SESSION_STORE '{SESSION_STORE}', using in-memory storage.")
+    return SessionStore()
@@ -91,6 +91,45 @@ function hideLoading() {
   }
 }
 
+function setLoadingText(text) {
+  const loadingDiv = document.getElementById("loading-indicator");
+  if (loadingDiv) {
+    loadingDiv.querySelector("span").textContent = text;
+  }
+}
+
+// Render text into an existing assistant message as it streams in
+function updateMessage(messageDiv, content) {
+  messageDiv.lastElementChild.innerHTML = parseMessage(content);
+  const chatDiv = document.getElementById("chat");
+  chatDiv.scrollTop = chatDiv.scrollHeight;
+}
+
+// Read Server-Sent Events from a fetch response, calling onEvent for each JSON payload
+async function readEventStream(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      for (const line of rawEvent.split("\n")) {
+        if (line.startsWith("data: ")) {
+          onEvent(JSON.parse(line.slice(6)));
+        }
+      }
+    }
+  }
+}
+
 async function sendOnEnter(event) {
   if (event.key === "Enter") {
     const input = event.target;
@@ -104,9 +143,13 @@ async function sendOnEnter(event) {
     // Show loading indicator
     showLoading();
 
+    // Assistant message that tokens are streamed into
+    let messageDiv = null;
+    let streamedText = "";
+
     try {
       const sessionId = getSessionId();
-      const res = await fetch("/chat", {
+      const res = await fetch("/chat/stream", {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ 
@@ -115,30 +158,60 @@ async function sendOnEnter(event) {
         })
       });
 
-      hideLoading();
-
       if (!res.ok) {
+        hideLoading();
         const errorData = await res.json().catch(() => ({ error: `HTTP ${res.status}: ${res.statusText}` }));
         addMessage(errorData.error || 'An error occurred', 'error');
         return;
       }
 
-      const data = await res.json();
-      
-      if (data.reply && data.reply.toLowerCase().includes('error')) {
-        addMessage(data.reply, 'error');
-      } else {
-        addMessage(data.reply || 'No response received', 'assistant');
-      }
-      
-      // Update session ID if it was created by backend
-      if (data.session_id) {
-        setSessionId(data.session_id);
-      }
+      await readEventStream(res, (data) => {
+        if (data.type === "session") {
+          // Update session ID if it was created by backend
+          setSessionId(data.session_id);
+        } else if (data.type === "tool_start") {
+          // Text streamed before a tool call isn't the answer: drop it and show tool progress again
+          if (messageDiv) {
+            messageDiv.remove();
+            messageDiv = null;
+            streamedText = "";
+          }
+          if (!document.getElementById("loading-indicator")) {
+            showLoading();
+          }
+          setLoadingText(`Running ${data.name}...`);
+        } else if (data.type === "tool_end") {
+          setLoadingText("AI is thinking...");
+        } else if (data.type === "token") {
+          hideLoading();
+          streamedText += data.content;
+          if (!messageDiv) {
+            messageDiv = addMessage("", 'assistant');
+          }
+          updateMessage(messageDiv, streamedText);
+        } else if (data.type === "done") {
+          hideLoading();
+          const reply = data.reply || 'No response received';
+          // An error reply doesn't match the text streamed so far (e.g. OpenAI failed mid-stream)
+          const isError = reply.toLowerCase().includes('error') && reply !== streamedText;
+          if (messageDiv && isError) {
+            messageDiv.remove();
+            addMessage(reply, 'error');
+          } else if (messageDiv) {
+            // Replace streamed text with the final reply
+            updateMessage(messageDiv, reply);
+          } else if (isError) {
+            addMessage(reply, 'error');
+          } else {
+            addMessage(reply, 'assistant');
+          }
+        }
+      });
     } catch (err) {
       hideLoading();
       addMessage(`Network error: ${err.message}. Please check your connection and try again.`, 'error');
     } finally {
+      hideLoading();
       input.disabled = false;
       input.focus();
     }
@@ -0,0 +1,116 @@
+"""
+On-disk cache of text extracted from Drive files.
+Entries are keyed by file ID plus file version (modifiedTime / md5Checksum),
+so an edited file is simply a cache miss. Least-recently-used entries are
+evicted once the cache grows past its size limit.
+"""
+import os
+import time
+import hashlib
+import sqlite3
+import threading
+
+# Directory holding cached text and the cache index
+CONTENT_CACHE_DIR = os.getenv("CONTENT_CACHE_DIR", "content_cache")
+
+# Max total size (bytes) of cached text on disk
+CONTENT_CACHE_MAX_BYTES = int(os.getenv("CONTENT_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+
+def file_version(file):
+    """Version string for a Drive file's metadata (needs modifiedTime and/or md5Checksum)."""
+    return f"{file.get('modifiedTime', '')}:{file.get('md5Checksum', '')}"
+
+
+class ContentCache:
+    """Size-bounded LRU cache of extracted file text, stored as files on disk."""
+
+    def __init__(self, directory=CONTENT_CACHE_DIR, max_bytes=CONTENT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "index.db"), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                file_id TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def _path(self, file_id):
+        return os.path.join(self.directory, hashlib.sha1(file_id.encode()).hexdigest() + ".txt")
+
+    def get(self, file_id, version):
+        """Cached text for this exact file version, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM entries WHERE file_id = ?", (file_id,)).fetchone()
+            if row is None or row[0] != version:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(file_id), "r", encoding="utf-8") as fh:
+                    text = fh.read()
+            except OSError:
+                self._delete(file_id)
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE entries SET last_access = ? WHERE file_id = ?", (time.time(), file_id))
+            self._conn.commit()
+            self.hits += 1
+            return text
+
+    def put(self, file_id, version, text):
+        """Store text for a file version (replacing any older version)."""
+        data = text.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            # Write to a temp file first so readers never see a partial entry
+            path = self._path(file_id)
+            tmp_path = path + ".tmp"
+            with open(tmp_path, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (file_id, version, size, last_access) VALUES (?, ?, ?, ?)",
+                (file_id, version, len(data), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _delete(self, file_id):
+        self._conn.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+        try:
+            os.remove(self._path(file_id))
+        except OSError:
+            pass
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for file_id, size in self._conn.execute(
+            "SELECT file_id, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._delete(file_id)
+            total -= size
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
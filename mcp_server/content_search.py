@@ -0,0 +1,109 @@
+"""
+Local ranked full-text search over Drive file text (SQLite FTS5, BM25 ranking).
+Files are indexed chunk by chunk (same boundaries as get_file) whenever their
+text is extracted, and re-indexed when the file version changes, so queries
+are answered locally with a snippet and the chunk to read next.
+"""
+import os
+import threading
+import sqlite3
+from document_chunks import split_chunks
+
+# SQLite file holding the content search index
+CONTENT_INDEX_PATH = os.getenv("CONTENT_INDEX_PATH", "content_index.db")
+
+# BM25 weight of a match in the file name relative to one in the body
+NAME_WEIGHT = 2.0
+
+# Tokens of context in each result snippet
+SNIPPET_TOKENS = 24
+
+
+def _match_query(text):
+    """FTS5 query matching any word of `text` (quoted, so user input can't inject FTS syntax)."""
+    words = [w for w in "".join(c if c.isalnum() else " " for c in text).split() if w]
+    return " OR ".join(f'"{w}"' for w in words)
+
+
+class ContentIndex:
+    """BM25 search over the extracted text of files, one row per chunk."""
+
+    def __init__(self, path=CONTENT_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS documents (
+                file_id TEXT PRIMARY KEY,
+                version TEXT NOT NULL,
+                name TEXT NOT NULL,
+                chunks INTEGER NOT NULL
+            );
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                file_id UNINDEXED, chunk UNINDEXED, name, body, tokenize = 'porter unicode61'
+            );
+        """)
+
+    def is_indexed(self, file_id, version):
+        with self._lock:
+            row = self._conn.execute("SELECT version FROM documents WHERE file_id = ?", (file_id,)).fetchone()
+        return row is not None and row["version"] == version
+
+    def add(self, file_id, version, name, text):
+        """Index (or re-index) a file version's text."""
+        bounds = split_chunks(text)
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks_fts WHERE file_id = ?", (file_id,))
+            self._conn.executemany(
+                "INSERT INTO chunks_fts (file_id, chunk, name, body) VALUES (?, ?, ?, ?)",
+                [(file_id, i, name, text[start:end]) for i, (start, end) in enumerate(bounds)],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (file_id, version, name, chunks) VALUES (?, ?, ?, ?)",
+                (file_id, version, name, len(bounds)),
+            )
+
+    def remove(self, file_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks_fts WHERE file_id = ?", (file_id,))
+            self._conn.execute("DELETE FROM documents WHERE file_id = ?", (file_id,))
+
+    def search(self, query, limit=5):
+        """
+        Best-matching chunk per file, most relevant first, as dicts with
+        'id', 'name', 'chunk', 'score' and 'snippet' (matches marked with [ ]).
+        """
+        match = _match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT file_id, chunk, name, bm25(chunks_fts, 0, 0, {NAME_WEIGHT}, 1.0) AS score, "
+                f"snippet(chunks_fts, 3, '[', ']', '...', {SNIPPET_TOKENS}) AS snippet "
+                "FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY score LIMIT ?",
+                (match, limit * 5),
+            ).fetchall()
+        results = []
+        seen = set()
+        for row in rows:
+            if row["file_id"] in seen:
+                continue
+            seen.add(row["file_id"])
+            # bm25() is lower-is-better; flip it so higher scores rank first
+            results.append({
+                "id": row["file_id"],
+                "name": row["name"],
+                "chunk": int(row["chunk"]),
+                "score": -row["score"],
+                "snippet": row["snippet"].replace("\n", " "),
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    def stats(self):
+        with self._lock:
+            files, chunks = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(chunks), 0) FROM documents").fetchone()
+        return {"files": files, "chunks": chunks}
@@ -0,0 +1,102 @@
+"""
+Splits extracted document text into stable, paragraph-aligned chunks so tools can
+return one section of a large file at a time instead of the whole text.
+Boundaries depend only on the text and FILE_CHUNK_CHARS, so chunk N of a file
+version is always the same; they're cached per file version in memory.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+# Target size (characters) of one chunk returned by get_file
+FILE_CHUNK_CHARS = int(os.getenv("FILE_CHUNK_CHARS", "4000"))
+
+# Number of file versions whose chunk boundaries are kept in memory
+FILE_CHUNK_CACHE_ENTRIES = int(os.getenv("FILE_CHUNK_CACHE_ENTRIES", "256"))
+
+# Longest line that can count as a heading in the outline
+MAX_HEADING_CHARS = 80
+
+
+def split_chunks(text, chunk_chars=FILE_CHUNK_CHARS):
+    """
+    (start, end) offsets covering `text` in chunks of at most `chunk_chars`.
+    Each cut prefers a paragraph break, then a line break, then whitespace,
+    within the last quarter of the window; otherwise it cuts mid-word.
+    """
+    bounds = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = start + chunk_chars
+        if end >= length:
+            bounds.append((start, length))
+            break
+        window_start = start + chunk_chars * 3 // 4
+        cut = -1
+        for sep in ("\n\n", "\n", " "):
+            cut = text.rfind(sep, window_start, end)
+            if cut != -1:
+                cut += len(sep)
+                break
+        if cut <= start:
+            cut = end
+        bounds.append((start, cut))
+        start = cut
+    return bounds
+
+
+def _is_heading(line, next_line):
+    stripped = line.strip()
+    if not stripped or len(stripped) > MAX_HEADING_CHARS:
+        return False
+    if stripped.startswith("#"):
+        return True
+    # Short line without closing punctuation, followed by a blank line or body text
+    return stripped[-1] not in ".,;:!?)\"'" and (not next_line.strip() or len(next_line.strip()) > len(stripped))
+
+
+def find_headings(text, bounds):
+    """(chunk index, heading text) for lines that look like section headings."""
+    headings = []
+    lines = text.split("\n")
+    offset = 0
+    chunk = 0
+    for i, line in enumerate(lines):
+        while chunk < len(bounds) - 1 and offset >= bounds[chunk][1]:
+            chunk += 1
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        if _is_heading(line, next_line):
+            headings.append((chunk, line.strip().lstrip("#").strip()))
+        offset += len(line) + 1
+    return headings
+
+
+class ChunkIndex:
+    """LRU cache of chunk boundaries and headings per (file ID, version)."""
+
+    def __init__(self, max_entries=FILE_CHUNK_CACHE_ENTRIES, chunk_chars=FILE_CHUNK_CHARS):
+        self.max_entries = max_entries
+        self.chunk_chars = chunk_chars
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, file_id, version, text):
+        """{'bounds': [(start, end), ...], 'headings': [(chunk, title), ...]} for this file version."""
+        key = (file_id, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        bounds = split_chunks(text, self.chunk_chars) or [(0, 0)]
+        entry = {"bounds": bounds, "headings": find_headings(text, bounds)}
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        return {"entries": len(self._entries), "chunk_chars": self.chunk_chars}
@@ -0,0 +1,177 @@
+"""
+Central wrapper for Drive API calls.
+Every call goes through a token-bucket rate limiter sized to our quota, is retried
+with exponential backoff and jitter on rate-limit and server errors, and identical
+requests running at the same time share one in-flight call (single flight).
+single_flight() is also used directly for work that isn't one request, such as
+downloading and extracting a file's text.
+"""
+import os
+import copy
+import time
+import random
+import socket
+import threading
+from concurrent.futures import Future
+from metrics import DRIVE_CALL_SECONDS, DRIVE_RATE_LIMIT_WAIT_SECONDS, DRIVE_RETRIES, DRIVE_COALESCED
+
+# Sustained Drive requests per second allowed from this process
+DRIVE_RATE_LIMIT = float(os.getenv("DRIVE_RATE_LIMIT", "10"))
+
+# Requests that may be sent in a burst above the sustained rate
+DRIVE_RATE_BURST = int(os.getenv("DRIVE_RATE_BURST", "20"))
+
+# Retries for retryable errors, and the first backoff delay (seconds)
+DRIVE_MAX_RETRIES = int(os.getenv("DRIVE_MAX_RETRIES", "5"))
+DRIVE_BACKOFF_BASE = float(os.getenv("DRIVE_BACKOFF_BASE", "0.5"))
+DRIVE_BACKOFF_MAX = 32.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+RETRYABLE_REASONS = {"userRateLimitExceeded", "rateLimitExceeded", "backendError", "internalError"}
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, holding at most `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        Take `tokens` tokens, sleeping until they are available.
+        Requests larger than the bucket wait for a full bucket and leave it in debt,
+        so the callers after them wait until the sustained rate is paid back.
+        """
+        needed = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait = (needed - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiter = TokenBucket(DRIVE_RATE_LIMIT, DRIVE_RATE_BURST)
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# Counters reported by stats()
+_counters = {"calls": 0, "retries": 0, "coalesced": 0}
+
+
+def is_retryable(error):
+    """True for Drive errors worth retrying: 429, 5xx and 403 rate-limit reasons."""
+    from googleapiclient.errors import HttpError
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status in RETRYABLE_STATUS:
+            return True
+        if status == 403:
+            reasons = {d.get("reason") for d in (error.error_details or []) if isinstance(d, dict)}
+            return bool(reasons & RETRYABLE_REASONS) or "rateLimitExceeded" in str(error)
+        return False
+    return isinstance(error, (socket.timeout, ConnectionError, TimeoutError))
+
+
+def _error_status(error):
+    from googleapiclient.errors import HttpError
+    if isinstance(error, HttpError):
+        return str(error.resp.status)
+    return "error"
+
+
+def backoff(attempt):
+    """Sleep before retry number `attempt` (0-based): full jitter up to the exponential backoff cap."""
+    delay = min(DRIVE_BACKOFF_MAX, DRIVE_BACKOFF_BASE * (2 ** attempt))
+    time.sleep(random.uniform(0, delay))
+    _counters["retries"] += 1
+    DRIVE_RETRIES.inc()
+
+
+def call_with_retry(fn, cost=1):
+    """
+    Call `fn()` under the rate limiter, retrying retryable errors with backoff and jitter.
+    `cost` is the number of Drive requests the call makes (e.g. the size of a batch).
+    """
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        rate_limiter.acquire(cost)
+        DRIVE_RATE_LIMIT_WAIT_SECONDS.observe(time.perf_counter() - start)
+        _counters["calls"] += 1
+        start = time.perf_counter()
+        try:
+            result = fn()
+            DRIVE_CALL_SECONDS.labels(status="ok").observe(time.perf_counter() - start)
+            return result
+        except Exception as e:
+            DRIVE_CALL_SECONDS.labels(status=_error_status(e)).observe(time.perf_counter() - start)
+            if attempt >= DRIVE_MAX_RETRIES or not is_retryable(e):
+                raise
+            backoff(attempt)
+            attempt += 1
+
+
+def _request_key(request):
+    uri = getattr(request, "uri", None)
+    if uri is None:
+        return None
+    return (getattr(request, "method", "GET"), uri, getattr(request, "body", None))
+
+
+def single_flight(key, fn, copy_result=False):
+    """
+    Run `fn()` once for all concurrent callers passing the same `key`: the first
+    caller runs it, the others wait and share its result (deep-copied when
+    `copy_result` is set, for mutable results).
+    """
+    with _inflight_lock:
+        future = _inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _inflight[key] = future
+        else:
+            _counters["coalesced"] += 1
+            DRIVE_COALESCED.inc()
+
+    if not leader:
+        result = future.result()
+        return copy.deepcopy(result) if copy_result else result
+
+    try:
+        result = fn()
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def drive_execute(request):
+    """
+    Execute a googleapiclient request through the limiter and retry policy.
+    Identical requests already in flight (same method, URL and body) are not
+    sent again; callers wait for the running one and share its result.
+    """
+    key = _request_key(request)
+    if key is None:
+        return call_with_retry(request.execute)
+    # Copy so callers never share (and mutate) the same response objects
+    return single_flight(key, lambda: call_with_retry(request.execute), copy_result=True)
+
+
+def stats():
+    return {**_counters, "inflight": len(_inflight)}
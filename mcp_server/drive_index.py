@@ -0,0 +1,315 @@
+"""
+Local index of Google Drive file metadata (SQLite + FTS5).
+Filled by one full listing, then kept current with the Drive Changes API,
+so name search and folder listings are answered locally instead of with files().list.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from drive_calls import drive_execute
+
+# SQLite file holding the metadata index
+DRIVE_INDEX_PATH = os.getenv("DRIVE_INDEX_PATH", "drive_index.db")
+
+# Seconds between incremental syncs in the background thread
+DRIVE_INDEX_SYNC_INTERVAL = float(os.getenv("DRIVE_INDEX_SYNC_INTERVAL", "60"))
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+FILE_FIELDS = "id, name, mimeType, modifiedTime, parents, trashed"
+
+
+def _fts_query(text):
+    """Turn free text into an FTS5 query: every word must prefix-match (like Drive's 'name contains')."""
+    words = [w for w in "".join(c if c.isalnum() else " " for c in text).split() if w]
+    return " AND ".join(f'"{w}"*' for w in words)
+
+
+class DriveIndex:
+    """Metadata index for the whole Drive: id, name, parents, mimeType and modifiedTime."""
+
+    def __init__(self, path=DRIVE_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_thread = None
+        self._stop = threading.Event()
+        # Set once a full sync has completed; a plain event so readers never wait on the write lock
+        self._ready = threading.Event()
+        # Bumped whenever the index content changes, so dependent in-process caches know to rebuild
+        self.generation = 0
+        # Bumped only when a folder is added, changed or removed (for the folder tree)
+        self.folder_generation = 0
+        # Persisted counterpart for clients outside this process: the Drive changes token
+        # at the last applied change (monotonic across restarts), or None before the first sync
+        self.version = None
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript("""
+            -- pk is an explicit rowid alias, so it survives VACUUM (files_fts rows point at it)
+            CREATE TABLE IF NOT EXISTS files (
+                pk INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                name TEXT NOT NULL,
+                mime_type TEXT,
+                modified_time TEXT,
+                parents TEXT
+            );
+            CREATE TABLE IF NOT EXISTS file_parents (
+                file_id TEXT NOT NULL,
+                parent_id TEXT NOT NULL,
+                PRIMARY KEY (parent_id, file_id)
+            );
+            CREATE INDEX IF NOT EXISTS idx_file_parents_file ON file_parents (file_id);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            -- Name search; each row's rowid is the `pk` of its files row, so deletes are indexed lookups
+            CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(name);
+        """)
+        self.version = self._get_state("version")
+        if self._get_state("page_token") is not None:
+            self._ready.set()
+
+    # ---- writes ----
+
+    def _upsert(self, f):
+        """Insert or replace one file; returns True if a folder was added or changed."""
+        was_folder = self._remove(f["id"])
+        parents = f.get("parents") or []
+        pk = self._conn.execute(
+            "INSERT INTO files (id, name, mime_type, modified_time, parents) VALUES (?, ?, ?, ?, ?)",
+            self._file_row(f),
+        ).lastrowid
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO file_parents (file_id, parent_id) VALUES (?, ?)",
+            [(f["id"], p) for p in parents],
+        )
+        self._conn.execute("INSERT INTO files_fts (rowid, name) VALUES (?, ?)", (pk, f.get("name", "")))
+        return was_folder or f.get("mimeType") == FOLDER_MIME
+
+    def _remove(self, file_id):
+        """Delete one file; returns True if it was a folder."""
+        row = self._conn.execute("SELECT pk, mime_type FROM files WHERE id = ?", (file_id,)).fetchone()
+        if row is None:
+            return False
+        self._conn.execute("DELETE FROM files_fts WHERE rowid = ?", (row["pk"],))
+        self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+        self._conn.execute("DELETE FROM file_parents WHERE file_id = ?", (file_id,))
+        return row["mime_type"] == FOLDER_MIME
+
+    @staticmethod
+    def _file_row(f):
+        return (f["id"], f.get("name", ""), f.get("mimeType"), f.get("modifiedTime"), json.dumps(f.get("parents") or []))
+
+    def _get_state(self, key):
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_state(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+
+    def full_sync(self, service):
+        """Rebuild the index from a complete files().list walk."""
+        # Take the change cursor first so nothing modified during the walk is missed
+        start_token = drive_execute(service.changes().getStartPageToken())["startPageToken"]
+        files = []
+        page_token = None
+        while True:
+            results = drive_execute(service.files().list(
+                q="trashed=false",
+                pageSize=1000,
+                pageToken=page_token,
+                fields=f"nextPageToken, files({FILE_FIELDS})",
+            ))
+            files.extend(results.get("files", []))
+            page_token = results.get("nextPageToken")
+            if not page_token:
+                break
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM files")
+            self._conn.execute("DELETE FROM file_parents")
+            self._conn.execute("DELETE FROM files_fts")
+            # Tables are empty, so bulk insert instead of per-file upserts
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO files (id, name, mime_type, modified_time, parents) VALUES (?, ?, ?, ?, ?)",
+                [self._file_row(f) for f in files],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO file_parents (file_id, parent_id) VALUES (?, ?)",
+                [(f["id"], p) for f in files for p in (f.get("parents") or [])],
+            )
+            self._conn.execute("INSERT INTO files_fts (rowid, name) SELECT pk, name FROM files")
+            self._set_state("page_token", start_token)
+            self._set_state("version", start_token)
+            self._set_state("last_sync", str(time.time()))
+            self.generation += 1
+            self.folder_generation += 1
+        self.version = start_token
+        self._ready.set()
+        return len(files)
+
+    def incremental_sync(self, service):
+        """Apply changes since the stored page token. Returns the number of changes applied."""
+        with self._lock:
+            page_token = self._get_state("page_token")
+        if page_token is None:
+            return self.full_sync(service)
+
+        applied = 0
+        while page_token:
+            results = drive_execute(service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                includeRemoved=True,
+                fields=f"nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}))",
+            ))
+            folders_changed = False
+            with self._lock, self._conn:
+                for change in results.get("changes", []):
+                    f = change.get("file")
+                    if change.get("removed") or not f or f.get("trashed"):
+                        folders_changed |= self._remove(change["fileId"])
+                    else:
+                        folders_changed |= self._upsert(f)
+                    applied += 1
+                # Persist progress after every page so a crash resumes from here
+                next_token = results.get("nextPageToken")
+                new_start = results.get("newStartPageToken")
+                self._set_state("page_token", next_token or new_start)
+                self._set_state("last_sync", str(time.time()))
+                if results.get("changes"):
+                    self._set_state("version", next_token or new_start)
+            if results.get("changes"):
+                self.generation += 1
+                self.version = next_token or new_start
+            if folders_changed:
+                self.folder_generation += 1
+            page_token = next_token
+        return applied
+
+    def sync(self, service):
+        """Full sync the first time, incremental afterwards."""
+        return self.incremental_sync(service)
+
+    def start_background_sync(self, service_factory, interval=DRIVE_INDEX_SYNC_INTERVAL):
+        """Sync now and then every `interval` seconds on a daemon thread."""
+        if self._sync_thread is not None:
+            return
+
+        def run():
+            while not self._stop.is_set():
+                try:
+                    self.sync(service_factory())
+                except Exception as e:
+                    print(f"Error syncing Drive index: {e}")
+                self._stop.wait(interval)
+
+        self._sync_thread = threading.Thread(target=run, name="drive-index-sync", daemon=True)
+        self._sync_thread.start()
+
+    def stop_background_sync(self):
+        self._stop.set()
+
+    # ---- reads ----
+
+    def is_ready(self):
+        """True once a full sync has completed."""
+        return self._ready.is_set()
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            "id": row["id"],
+            "name": row["name"],
+            "mimeType": row["mime_type"],
+            "modifiedTime": row["modified_time"],
+            "parents": json.loads(row["parents"] or "[]"),
+        }
+
+    def get(self, file_id):
+        """Metadata for one file, or None if it isn't indexed."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM files WHERE id = ?", (file_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list_folder(self, folder_id, limit=None, offset=0):
+        """Files directly inside a folder, sorted by name."""
+        return self.list_folders([folder_id], limit=limit, offset=offset)
+
+    def list_folders(self, folder_ids, limit=None, offset=0):
+        """Files directly inside any of the folders, merged and sorted by name."""
+        placeholders = ", ".join("?" for _ in folder_ids)
+        sql = (
+            "SELECT DISTINCT f.* FROM file_parents p JOIN files f ON f.id = p.file_id "
+            f"WHERE p.parent_id IN ({placeholders}) ORDER BY f.name COLLATE NOCASE, f.id"
+        )
+        params = list(folder_ids)
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def search_by_name(self, query, folder_id=None, limit=None, folder_ids=None, offset=0):
+        """
+        Files whose name matches every word of `query` (prefix match), sorted by name.
+        Optionally restricted to files directly inside `folder_id` / `folder_ids`.
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+        if folder_id:
+            folder_ids = [folder_id]
+        sql = "SELECT DISTINCT f.* FROM files_fts s JOIN files f ON f.pk = s.rowid "
+        params = []
+        if folder_ids:
+            placeholders = ", ".join("?" for _ in folder_ids)
+            sql += f"JOIN file_parents p ON p.file_id = f.id AND p.parent_id IN ({placeholders}) "
+            params += list(folder_ids)
+        sql += "WHERE files_fts MATCH ? ORDER BY f.name COLLATE NOCASE, f.id"
+        params.append(match)
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            params += [limit, offset]
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def subfolders(self, folder_ids, max_folders=None):
+        """All folders below `folder_ids` (breadth first), as dicts with 'id' and 'name'."""
+        seen = set(folder_ids)
+        found = []
+        level = list(folder_ids)
+        with self._lock:
+            while level and (max_folders is None or len(found) < max_folders):
+                placeholders = ", ".join("?" for _ in level)
+                rows = self._conn.execute(
+                    "SELECT f.id, f.name FROM file_parents p JOIN files f ON f.id = p.file_id "
+                    f"WHERE p.parent_id IN ({placeholders}) AND f.mime_type = ? ORDER BY f.name COLLATE NOCASE",
+                    level + [FOLDER_MIME],
+                ).fetchall()
+                level = []
+                for row in rows:
+                    if row["id"] in seen or (max_folders is not None and len(found) >= max_folders):
+                        continue
+                    seen.add(row["id"])
+                    found.append({"id": row["id"], "name": row["name"]})
+                    level.append(row["id"])
+        return found
+
+    def folders(self):
+        """Every indexed folder."""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM files WHERE mime_type = ?", (FOLDER_MIME,)).fetchall()
+        return [self._to_dict(r) for r in rows]
+
+    def stats(self):
+        with self._lock:
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            last_sync = self._get_state("last_sync")
+        return {"files": files, "last_sync": float(last_sync) if last_sync else None}
@@ -1,33 +1,118 @@
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
-from google.auth.transport.requests import Request
-import os, pickle
+import os, pickle, json, base64, threading, datetime
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from folder_tree import FolderTree
+from drive_calls import drive_execute, call_with_retry, backoff, is_retryable, DRIVE_MAX_RETRIES
 
 SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 
+# Refresh the access token this long before it actually expires
+TOKEN_REFRESH_MARGIN = datetime.timedelta(seconds=int(os.getenv("DRIVE_TOKEN_REFRESH_MARGIN", "300")))
+
 # Cache for the first 5 folders (IDs and names to save API calls)
 _TARGET_FOLDERS = None  # List of dicts with 'id' and 'name'
+_TARGET_FOLDERS_FETCHED_AT = 0.0
 
-def get_drive_service():
-    creds = None
-    token_path = "token.pickle"
-
-    # Load token if it exists
-    if os.path.exists(token_path):
-        with open(token_path, "rb") as token:
-            creds = pickle.load(token)
-
-    # If no valid credentials, prompt login
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
-            creds = flow.run_local_server(port=0)
-        with open(token_path, "wb") as token:
+# Seconds before the first-5-folders cache is refetched
+TARGET_FOLDERS_TTL = float(os.getenv("TARGET_FOLDERS_TTL", "300"))
+
+# Name/path -> ID index of every folder, used by find_folder_by_name
+folder_tree = FolderTree()
+
+
+class DriveServiceManager:
+    """
+    Process-level holder for Drive credentials and service objects.
+    Credentials are loaded once and refreshed shortly before they expire.
+    The discovery document is parsed once; each thread gets its own service
+    with its own httplib2.Http, since httplib2 is not thread-safe.
+    """
+
+    def __init__(self, token_path="token.pickle", credentials_path="credentials.json"):
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        self._creds = None
+        self._discovery_doc = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _load_credentials(self):
+        # Only needed when (re)authorizing, so imported here to keep start-up fast
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from google.auth.transport.requests import Request
+
+        creds = None
+
+        # Load token if it exists
+        if os.path.exists(self.token_path):
+            with open(self.token_path, "rb") as token:
+                creds = pickle.load(token)
+
+        # If no valid credentials, prompt login
+        if not creds or not creds.valid:
+            if creds and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            else:
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
+                creds = flow.run_local_server(port=0)
+            self._save_credentials(creds)
+        return creds
+
+    def _save_credentials(self, creds):
+        with open(self.token_path, "wb") as token:
             pickle.dump(creds, token)
 
-    return build("drive", "v3", credentials=creds)
+    def _needs_refresh(self, creds):
+        if not creds.valid:
+            return True
+        if creds.expiry is None:
+            return False
+        # google-auth stores expiry as a naive UTC datetime
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return creds.expiry - now < TOKEN_REFRESH_MARGIN
+
+    def get_credentials(self):
+        """Return cached credentials, refreshing them proactively near expiry."""
+        with self._lock:
+            if self._creds is None:
+                self._creds = self._load_credentials()
+            elif self._needs_refresh(self._creds) and self._creds.refresh_token:
+                from google.auth.transport.requests import Request
+                self._creds.refresh(Request())
+                self._save_credentials(self._creds)
+            return self._creds
+
+    def _get_discovery_doc(self):
+        from googleapiclient.discovery_cache import get_static_doc
+
+        with self._lock:
+            if self._discovery_doc is None:
+                self._discovery_doc = json.loads(get_static_doc("drive", "v3"))
+            return self._discovery_doc
+
+    def get_service(self):
+        """Return this thread's Drive service, building it on first use."""
+        creds = self.get_credentials()
+        service = getattr(self._local, "service", None)
+        if service is None:
+            # The client library is imported on first use (normally during warmup)
+            from googleapiclient.discovery import build_from_document
+            import google_auth_httplib2
+            import httplib2
+
+            http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http())
+            service = build_from_document(self._get_discovery_doc(), http=http)
+            self._local.service = service
+        return service
+
+
+# Shared by every tool in server.py
+drive_manager = DriveServiceManager()
+
+
+def get_drive_service():
+    return drive_manager.get_service()
 
 
 def get_first_5_folders(service):
@@ -35,24 +120,25 @@ def get_first_5_folders(service):
     Get the first 5 folders from Google Drive.
     Returns a list of folder IDs.
     """
-    global _TARGET_FOLDERS
+    global _TARGET_FOLDERS, _TARGET_FOLDERS_FETCHED_AT
     
-    # Return cached folder IDs if already fetched
-    if _TARGET_FOLDERS is not None:
+    # Return cached folder IDs if already fetched and not expired
+    if _TARGET_FOLDERS is not None and time.monotonic() - _TARGET_FOLDERS_FETCHED_AT < TARGET_FOLDERS_TTL:
         return [folder["id"] for folder in _TARGET_FOLDERS]
     
     try:
         # Query for folders only (mimeType = 'application/vnd.google-apps.folder')
-        results = service.files().list(
+        results = drive_execute(service.files().list(
             q="mimeType='application/vnd.google-apps.folder' and trashed=false",
             pageSize=5,
             fields="files(id, name)",
             orderBy="modifiedTime desc"
-        ).execute()
+        ))
         
         folders = results.get("files", [])
         # Cache folders with both ID and name to save API calls
         _TARGET_FOLDERS = [{"id": folder["id"], "name": folder.get("name", "Unknown")} for folder in folders]
+        _TARGET_FOLDERS_FETCHED_AT = time.monotonic()
         
         return [folder["id"] for folder in _TARGET_FOLDERS]
     except Exception as e:
@@ -65,31 +151,231 @@ def get_first_5_folders_with_names(service):
     Get the first 5 folders from Google Drive with their names.
     Returns a list of dicts with 'id' and 'name' keys.
     """
-    global _TARGET_FOLDERS
-    
-    # Return cached folders if already fetched
-    if _TARGET_FOLDERS is not None:
-        return _TARGET_FOLDERS
-    
-    # This will populate the cache
+    # This returns early from the cache or (re)populates it
     get_first_5_folders(service)
     return _TARGET_FOLDERS if _TARGET_FOLDERS else []
 
 
-def find_folder_by_name(service, folder_name):
+def find_folder_by_name(service, folder_name, index=None):
     """
-    Search for a folder by name, limited to the first 5 folders only
-    to reduce API calls and avoid quota overuse.
+    Find a folder ID by name or full path (e.g. "Projects/2025/Reports"), case-insensitive.
+    Looks up the local folder tree, which is rebuilt from `index` (the local Drive index)
+    or the Drive API when stale; a unique prefix also matches.
     """
     try:
-        # Retrieve only the first 5 folders (cached or limited API)
-        folders = get_first_5_folders_with_names(service)
-        for folder in folders:
-            if folder.get("name", "").lower() == folder_name.lower():
-                return folder["id"]
-
-        return None
+        return folder_tree.find(service, folder_name, index=index)
 
     except Exception as e:
         print(f"Error finding folder by name: {e}")
         return None
+
+
+def warm_up(service, index=None):
+    """
+    Fill the target-folder list and folder tree ahead of the first request.
+    Raises if Drive can't be reached so the caller can retry.
+    """
+    folder_tree.refresh(service, index)
+    get_first_5_folders(service)
+
+
+def suggest_folders(service, folder_name, index=None):
+    """Folder paths starting with `folder_name`, to suggest when a lookup fails."""
+    try:
+        return folder_tree.suggest(service, folder_name, index=index)
+    except Exception as e:
+        print(f"Error suggesting folders: {e}")
+        return []
+
+
+# Drive accepts at most 100 calls in one batch HTTP request
+DRIVE_BATCH_LIMIT = 100
+
+
+def get_files_metadata(service, file_ids, fields="id, name, modifiedTime"):
+    """
+    Metadata for many files using Drive batch HTTP requests
+    (one round trip per 100 IDs instead of one per file).
+    Each ID is charged to the rate limiter, and IDs that hit a rate-limit or server
+    error are sent again with backoff.
+    Returns a dict of file ID -> metadata; IDs that failed are left out.
+    """
+    pending = list(dict.fromkeys(file_ids))
+    results = {}
+    attempt = 0
+
+    while pending:
+        errors = {}
+
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                errors[request_id] = exception
+            else:
+                results[request_id] = response
+
+        for start in range(0, len(pending), DRIVE_BATCH_LIMIT):
+            chunk = pending[start:start + DRIVE_BATCH_LIMIT]
+            batch = service.new_batch_http_request(callback=on_response)
+            for file_id in chunk:
+                batch.add(service.files().get(fileId=file_id, fields=fields), request_id=file_id)
+            # Drive charges quota per call inside the batch, not per batch
+            call_with_retry(batch.execute, cost=len(chunk))
+
+        retry = [f_id for f_id, e in errors.items() if is_retryable(e)]
+        for f_id, e in errors.items():
+            if f_id not in retry or attempt >= DRIVE_MAX_RETRIES:
+                print(f"Error fetching metadata for {f_id}: {e}")
+        if not retry or attempt >= DRIVE_MAX_RETRIES:
+            break
+        backoff(attempt)
+        attempt += 1
+        pending = retry
+    return results
+
+
+
+# Threads used to query several folders at once (each thread has its own Drive service)
+DRIVE_FANOUT_WORKERS = int(os.getenv("DRIVE_FANOUT_WORKERS", "8"))
+
+# Upper bound on folders visited by a recursive listing or search
+MAX_RECURSIVE_FOLDERS = int(os.getenv("MAX_RECURSIVE_FOLDERS", "100"))
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+_fanout_executor = ThreadPoolExecutor(max_workers=DRIVE_FANOUT_WORKERS, thread_name_prefix="drive-fanout")
+
+
+def fan_out(fn, items):
+    """`[fn(item) for item in items]`, run concurrently on the fan-out threads (results in order)."""
+    # Each call gets its own copy of the caller's context variables (e.g. the request ID)
+    context = contextvars.copy_context()
+    return list(_fanout_executor.map(lambda item: context.copy().run(fn, item), items))
+
+
+def escape_query(value):
+    """Escape a string for use inside a quoted value in a Drive `q` query."""
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def encode_cursor(state):
+    """Opaque page token handed back to the caller."""
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode()
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor(); raises ValueError for a malformed token."""
+    try:
+        return json.loads(base64.urlsafe_b64decode(token.encode()).decode())
+    except Exception:
+        raise ValueError(f"Invalid page_token: {token}")
+
+
+def _list_child_folders(folder_id):
+    service = get_drive_service()
+    folders = []
+    page_token = None
+    while True:
+        results = drive_execute(service.files().list(
+            q=f"'{escape_query(folder_id)}' in parents and mimeType='{FOLDER_MIME}' and trashed=false",
+            pageSize=1000,
+            pageToken=page_token,
+            fields="nextPageToken, files(id, name)"
+        ))
+        folders.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return folders
+
+
+def list_subfolders(folder_ids, max_folders=MAX_RECURSIVE_FOLDERS):
+    """
+    All folders below `folder_ids` (breadth first), each level queried concurrently.
+    Returns a list of dicts with 'id' and 'name', at most `max_folders` long.
+    """
+    seen = set(folder_ids)
+    found = []
+    level = list(folder_ids)
+    while level and len(found) < max_folders:
+        next_level = []
+        for children in fan_out(_list_child_folders, level):
+            for folder in children:
+                if folder["id"] not in seen and len(found) < max_folders:
+                    seen.add(folder["id"])
+                    found.append(folder)
+                    next_level.append(folder["id"])
+        level = next_level
+    return found
+
+
+def _sort_key(f):
+    return (f.get("name", "").lower(), f["id"])
+
+
+def _fetch_folder_page(folder_id, extra_query, page_size, page_token):
+    service = get_drive_service()
+    query = f"'{escape_query(folder_id)}' in parents and trashed=false"
+    if extra_query:
+        query += f" and ({extra_query})"
+    results = drive_execute(service.files().list(
+        q=query,
+        pageSize=page_size,
+        pageToken=page_token,
+        orderBy="name",
+        fields="nextPageToken, files(id, name, mimeType, modifiedTime, parents)"
+    ))
+    return results.get("files", []), results.get("nextPageToken")
+
+
+def list_folders_page(folder_ids, extra_query=None, page_size=10, state=None):
+    """
+    One page of files from several folders, merged in name order.
+    Every folder is queried concurrently on the fan-out pool with its own Drive page token.
+
+    `state` maps folder ID -> [drive_page_token, items_already_returned_from_that_page];
+    pass None for the first page. Returns (files, next_state); next_state is None when
+    every folder is exhausted. A page can come back short: merging stops as soon as a
+    folder with more Drive pages runs out of fetched rows, so name order stays correct.
+    """
+    if state is None:
+        state = {f_id: [None, 0] for f_id in folder_ids}
+    merged, next_state = _merge_folder_pages(extra_query, page_size, state)
+    # Drive can return an empty page that still has a next token; keep going until we have something
+    while not merged and next_state:
+        merged, next_state = _merge_folder_pages(extra_query, page_size, next_state)
+    return merged, next_state
+
+
+def _merge_folder_pages(extra_query, page_size, state):
+    folders = list(state)
+
+    # Each folder re-reads at most one page from its stored token; `skip` is always below page_size
+    def fetch(f_id):
+        page_token, skip = state[f_id]
+        files, next_token = _fetch_folder_page(f_id, extra_query, page_size, page_token)
+        return files[skip:], next_token
+
+    pages = dict(zip(folders, fan_out(fetch, folders)))
+
+    # k-way merge over the head of each folder's page (always consumes a prefix per folder)
+    merged = []
+    positions = {f_id: 0 for f_id in folders}
+    while len(merged) < page_size:
+        # A folder with more pages on Drive but no rows left here could hold the next name
+        if any(positions[f_id] >= len(pages[f_id][0]) and pages[f_id][1] for f_id in folders):
+            break
+        candidates = [f_id for f_id in folders if positions[f_id] < len(pages[f_id][0])]
+        if not candidates:
+            break
+        f_id = min(candidates, key=lambda c: _sort_key(pages[c][0][positions[c]]))
+        merged.append(pages[f_id][0][positions[f_id]])
+        positions[f_id] += 1
+
+    next_state = {}
+    for f_id in folders:
+        remaining, next_token = pages[f_id]
+        page_token, skip = state[f_id]
+        if positions[f_id] < len(remaining):
+            next_state[f_id] = [page_token, skip + positions[f_id]]
+        elif next_token:
+            next_state[f_id] = [next_token, 0]
+    return merged, (next_state or None)
@@ -0,0 +1,157 @@
+"""
+In-memory index of the Drive folder hierarchy.
+Maps folder names and full paths (e.g. "Projects/2025/Reports") to folder IDs,
+with case-insensitive exact and prefix lookup. Rebuilt when its TTL expires or
+when the local Drive index reports folder changes.
+"""
+import os
+import time
+import bisect
+import threading
+from drive_calls import drive_execute
+
+# Seconds before the folder tree is rebuilt
+FOLDER_TREE_TTL = float(os.getenv("FOLDER_TREE_TTL", "300"))
+
+# Max folders held in memory (bounds the tree on huge drives)
+FOLDER_TREE_MAX_FOLDERS = int(os.getenv("FOLDER_TREE_MAX_FOLDERS", "50000"))
+
+# Deepest path built for a folder (also guards against parent cycles)
+MAX_FOLDER_DEPTH = 32
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+def _fetch_folders(service, max_folders):
+    """Every folder in Drive (id, name, parents), most recently modified first."""
+    folders = []
+    page_token = None
+    while len(folders) < max_folders:
+        results = drive_execute(service.files().list(
+            q=f"mimeType='{FOLDER_MIME}' and trashed=false",
+            pageSize=1000,
+            pageToken=page_token,
+            orderBy="modifiedTime desc",
+            fields="nextPageToken, files(id, name, parents)"
+        ))
+        folders.extend(results.get("files", []))
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            break
+    return folders[:max_folders]
+
+
+class _Snapshot:
+    """One immutable build of the tree; swapped in whole so readers never see a partial build."""
+
+    def __init__(self, keys=(), lookup=None, paths=None):
+        self.keys = keys              # sorted lowercase names and paths, for prefix lookup
+        self.lookup = lookup or {}    # lowercase name or path -> list of folder IDs
+        self.paths = paths or {}      # folder ID -> display path
+
+
+class FolderTree:
+    """Name/path -> folder ID lookup table built from the folder hierarchy."""
+
+    def __init__(self, ttl=FOLDER_TREE_TTL, max_folders=FOLDER_TREE_MAX_FOLDERS):
+        self.ttl = ttl
+        self.max_folders = max_folders
+        self._lock = threading.Lock()
+        self._built_at = 0.0
+        self._generation = None
+        self._snapshot = _Snapshot()
+
+    def _is_stale(self, index):
+        if not self._built_at or time.monotonic() - self._built_at > self.ttl:
+            return True
+        # Only folder changes matter; file changes elsewhere in Drive don't touch the tree
+        return index is not None and index.folder_generation != self._generation
+
+    def _build(self, folders):
+        by_id = {f["id"]: f for f in folders}
+        path_cache = {}
+
+        def path_of(folder_id, depth=0):
+            if folder_id in path_cache:
+                return path_cache[folder_id]
+            folder = by_id[folder_id]
+            parent = next((p for p in folder.get("parents") or [] if p in by_id), None)
+            if parent is None or depth >= MAX_FOLDER_DEPTH:
+                path = folder.get("name", "")
+            else:
+                path = f"{path_of(parent, depth + 1)}/{folder.get('name', '')}"
+            path_cache[folder_id] = path
+            return path
+
+        lookup = {}
+        paths = {}
+        for f in folders:
+            path = path_of(f["id"])
+            paths[f["id"]] = path
+            for key in {f.get("name", "").lower(), path.lower()}:
+                lookup.setdefault(key, []).append(f["id"])
+
+        self._snapshot = _Snapshot(sorted(lookup), lookup, paths)
+        self._built_at = time.monotonic()
+
+    def refresh(self, service, index=None):
+        """Rebuild from the local Drive index when it's ready, otherwise from the Drive API."""
+        with self._lock:
+            if index is not None and index.is_ready():
+                folders = index.folders()[:self.max_folders]
+                self._generation = index.folder_generation
+            else:
+                folders = _fetch_folders(service, self.max_folders)
+                self._generation = index.folder_generation if index is not None else None
+            self._build(folders)
+
+    def _ensure_fresh(self, service, index):
+        if self._is_stale(index):
+            self.refresh(service, index)
+
+    def find(self, service, name_or_path, index=None):
+        """
+        Folder ID for a name or full path (case-insensitive).
+        Falls back to a prefix match when exactly one of the shallowest matching folders
+        starts with it (so "proj" finds "Projects" rather than "Projects/2025").
+        """
+        self._ensure_fresh(service, index)
+        snapshot = self._snapshot
+        key = name_or_path.strip().strip("/").lower()
+        ids = snapshot.lookup.get(key)
+        if ids:
+            return ids[0]
+        matches = self._prefix_ids(snapshot, key, limit=50)
+        if not matches:
+            return None
+        depth = min(snapshot.paths[f_id].count("/") for f_id in matches)
+        shallowest = [f_id for f_id in matches if snapshot.paths[f_id].count("/") == depth]
+        return shallowest[0] if len(shallowest) == 1 else None
+
+    def suggest(self, service, prefix, index=None, limit=10):
+        """Paths of folders whose name or path starts with `prefix`."""
+        self._ensure_fresh(service, index)
+        snapshot = self._snapshot
+        return [snapshot.paths[f_id] for f_id in self._prefix_ids(snapshot, prefix.strip().strip("/").lower(), limit)]
+
+    @staticmethod
+    def _prefix_ids(snapshot, prefix, limit):
+        ids = []
+        keys = snapshot.keys
+        for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+            key = keys[i]
+            if not key.startswith(prefix):
+                break
+            for f_id in snapshot.lookup[key]:
+                if f_id not in ids:
+                    ids.append(f_id)
+            if len(ids) >= limit:
+                break
+        return ids[:limit]
+
+    def invalidate(self):
+        self._built_at = 0.0
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {"folders": len(snapshot.paths), "keys": len(snapshot.keys), "age_seconds": time.monotonic() - self._built_at}
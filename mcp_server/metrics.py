@@ -0,0 +1,71 @@
+"""
+Prometheus metrics and lightweight tracing for the Drive MCP server.
+Tool calls, Drive API calls and text extraction are timed into histograms.
+The backend's request ID (sent in the tool call's _meta) is kept in a context
+variable so TRACE_SPANS output from both services can be matched up.
+Only depends on prometheus_client, so the Drive modules can import it without
+pulling in fastmcp (the tool middleware lives in tool_middleware.py).
+"""
+import os
+import time
+import contextvars
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+# Print every span with its request ID (in addition to recording the histogram)
+TRACE_SPANS = os.getenv("TRACE_SPANS", "false").lower() in ("1", "true", "yes")
+
+# Request ID of the tool call being handled (None outside a call)
+request_id_var = contextvars.ContextVar("request_id", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+TOOL_SECONDS = Histogram(
+    "mcp_tool_seconds", "Time spent handling each MCP tool call", ["tool", "status"], buckets=LATENCY_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "mcp_stage_seconds", "Time spent in each stage of a tool call", ["stage"], buckets=LATENCY_BUCKETS
+)
+DRIVE_CALL_SECONDS = Histogram(
+    "drive_api_call_seconds", "Drive API request latency (one attempt)", ["status"], buckets=LATENCY_BUCKETS
+)
+DRIVE_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "drive_rate_limit_wait_seconds", "Time spent waiting for the Drive rate limiter", buckets=LATENCY_BUCKETS
+)
+DRIVE_RETRIES = Counter("drive_api_retries_total", "Drive API requests retried after a retryable error")
+DRIVE_COALESCED = Counter("drive_api_coalesced_total", "Drive API requests served by an identical in-flight call")
+
+TOOL_EXECUTOR = Gauge("mcp_tool_executor_calls", "Tool calls running on / queued for the Drive thread pool", ["state"])
+
+CACHE_HITS = Gauge("cache_hits", "Cache hits since start", ["cache"])
+CACHE_MISSES = Gauge("cache_misses", "Cache misses since start", ["cache"])
+CACHE_HIT_RATIO = Gauge("cache_hit_ratio", "Cache hits / lookups since start", ["cache"])
+
+
+def current_request_id():
+    return request_id_var.get()
+
+
+@contextmanager
+def span(stage):
+    """Time the enclosed block as `stage` in mcp_stage_seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        if TRACE_SPANS:
+            print(f"[{current_request_id() or '-'}] {stage} {elapsed * 1000:.1f}ms")
+
+
+def track_cache(name, stats):
+    """Export hits/misses/hit_rate from a cache's stats() function, read at scrape time."""
+    CACHE_HITS.labels(cache=name).set_function(lambda: stats()["hits"])
+    CACHE_MISSES.labels(cache=name).set_function(lambda: stats()["misses"])
+    CACHE_HIT_RATIO.labels(cache=name).set_function(lambda: stats()["hit_rate"])
+
+
+def render():
+    """(body, content type) for a Prometheus scrape."""
+    return generate_latest(), CONTENT_TYPE_LATEST
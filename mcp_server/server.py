@@ -1,122 +1,359 @@
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import asynccontextmanager
 from fastmcp import FastMCP
-from drive_utils import get_drive_service, get_first_5_folders, get_first_5_folders_with_names, find_folder_by_name
+from starlette.responses import Response, JSONResponse
+from drive_utils import get_drive_service, get_first_5_folders, get_first_5_folders_with_names, find_folder_by_name, suggest_folders, get_files_metadata, fan_out, list_subfolders, list_folders_page, escape_query, encode_cursor, decode_cursor, warm_up, MAX_RECURSIVE_FOLDERS
+from text_extraction import extract_text, extract_preview, preload as preload_extraction
+from drive_index import DriveIndex
+from content_cache import ContentCache, file_version
+from tool_executor import offload, run_blocking, stats as tool_executor_stats
+from drive_calls import drive_execute, single_flight
+from document_chunks import ChunkIndex, FILE_CHUNK_CHARS
+from content_search import ContentIndex
+from tool_cache import ToolResultCache
+from metrics import span, track_cache, render, TOOL_EXECUTOR
+from tool_middleware import ToolMetricsMiddleware
 
-mcp = FastMCP(name="google-drive-mcp")
+# Serve name search and folder listings from a local metadata index (kept in sync via the Changes API)
+DRIVE_INDEX_ENABLED = os.getenv("DRIVE_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
 
+drive_index = DriveIndex() if DRIVE_INDEX_ENABLED else None
 
-@mcp.tool()
-def list_files(folder_id: str = None, folder_name: str = None) -> str:
+# Extracted file text, keyed by file ID + version
+content_cache = ContentCache()
+
+# Ranked (BM25) search over the text of files we've extracted
+content_index = ContentIndex()
+
+# Results of deterministic tools, keyed by arguments + Drive version
+tool_cache = ToolResultCache()
+
+# Chunk boundaries per file version, for paged get_file reads
+chunk_index = ChunkIndex()
+
+# Default number of characters summarize_file returns
+SUMMARY_PREVIEW_CHARS = int(os.getenv("SUMMARY_PREVIEW_CHARS", "100"))
+
+
+# Seconds between warmup attempts while Drive is unreachable
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "5"))
+
+# Set once warmup has finished; /ready returns 503 until then
+_ready = threading.Event()
+
+
+def _warm_up(stop):
+    """Build the Drive client, fill the folder caches and load extraction libraries, retrying until it works."""
+    start = time.perf_counter()
+    while not stop.is_set():
+        try:
+            warm_up(get_drive_service(), drive_index)
+            preload_extraction()
+            _ready.set()
+            print(f"Warmup finished in {time.perf_counter() - start:.2f}s")
+            return
+        except Exception as e:
+            print(f"Warmup failed, retrying in {WARMUP_RETRY_INTERVAL:g}s: {e}")
+            stop.wait(WARMUP_RETRY_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(server):
+    if drive_index is not None:
+        drive_index.start_background_sync(get_drive_service)
+    # Warm up in the background so the server starts listening (and answering /ready) right away
+    stop = threading.Event()
+    threading.Thread(target=_warm_up, args=(stop,), name="warmup", daemon=True).start()
+    yield
+    stop.set()
+    if drive_index is not None:
+        drive_index.stop_background_sync()
+
+
+mcp = FastMCP(name="google-drive-mcp", lifespan=lifespan)
+mcp.add_middleware(ToolMetricsMiddleware())
+
+# Cache hit rates and executor load exported on /metrics
+track_cache("content", content_cache.stats)
+track_cache("tool_results", tool_cache.stats)
+TOOL_EXECUTOR.labels(state="running").set_function(lambda: tool_executor_stats()["running"])
+TOOL_EXECUTOR.labels(state="queued").set_function(lambda: tool_executor_stats()["queued"])
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request):
+    """Prometheus metrics: tool, Drive API and extraction latency, retries and cache hit rates."""
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+
+@mcp.custom_route("/ready", methods=["GET"])
+async def ready(request):
+    """Readiness check: 200 once the Drive client and folder caches are warm, 503 before."""
+    body = {"ready": _ready.is_set(), "index_ready": _index_ready()}
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+
+def _index_ready():
+    return drive_index is not None and drive_index.is_ready()
+
+
+# ---- tool result cache versions (None means "don't cache") ----
+
+def _index_generation(**arguments):
+    """Version for listings and searches: changes whenever the metadata index syncs a change."""
+    return f"gen:{drive_index.generation}" if _index_ready() else None
+
+
+# Metadata fetched by a file tool's cache version check, reused by the tool body on a miss.
+# Set inside the tool call's own context (each call runs in a copied context on the pool).
+_prefetched_metadata = contextvars.ContextVar("prefetched_metadata", default=None)
+
+
+def _file_modified(**arguments):
     """
-    List files in a specific folder or let the user pick from first 5 folders.
-    Returns up to 10 files per folder.
+    Version for single-file tools: the file's live modifiedTime/md5Checksum from one
+    cheap files().get, so an edited file is a cache miss right away (the metadata
+    index can lag by up to DRIVE_INDEX_SYNC_INTERVAL).
     """
-    service = get_drive_service()
-    folder_ids = []
+    try:
+        file = drive_execute(get_drive_service().files().get(fileId=arguments["file_id"], fields=FILE_META_FIELDS))
+    except Exception:
+        return None
+    _prefetched_metadata.set({file["id"]: file})
+    return file_version(file)
+
+
+def _files_modified(**arguments):
+    """Version for batch tools: every file's live version, from one batch metadata request."""
+    file_ids = list(dict.fromkeys(arguments["file_ids"]))
+    if not file_ids or len(file_ids) > MAX_BATCH_FILES:
+        return None
+    metadata = get_files_metadata(get_drive_service(), file_ids, fields=FILE_META_FIELDS)
+    # None marks IDs that were looked up but not found, so the tool doesn't ask again
+    _prefetched_metadata.set({f_id: metadata.get(f_id) for f_id in file_ids})
+    if len(metadata) < len(file_ids):
+        return None
+    return ",".join(file_version(metadata[f_id]) for f_id in file_ids)
+
+
+def _file_metadata(service, file_id):
+    """FILE_META_FIELDS metadata for a file, reusing what the cache version check fetched."""
+    file = (_prefetched_metadata.get() or {}).get(file_id)
+    if file is None:
+        file = drive_execute(service.files().get(fileId=file_id, fields=FILE_META_FIELDS))
+    return file
+
+
+def _is_error_result(result):
+    return result.startswith(("⚠️", "Error")) or "Error reading file" in result
 
-    # If user provided folder_name or folder_id, use it
+
+def _folder_display_names(service, folder_ids):
+    """Names for folder IDs: index or cached folders first, one batch call for the rest."""
+    names = {}
+    cached = {f["id"]: f.get("name") for f in get_first_5_folders_with_names(service)}
+    for f_id in folder_ids:
+        folder = drive_index.get(f_id) if _index_ready() else None
+        if folder:
+            names[f_id] = folder["name"]
+        elif f_id in cached:
+            names[f_id] = cached[f_id]
+    missing = [f_id for f_id in folder_ids if f_id not in names]
+    if missing:
+        try:
+            for f_id, meta in get_files_metadata(service, missing, fields="id, name").items():
+                names[f_id] = meta.get("name")
+        except Exception as e:
+            print(f"Error fetching folder names: {e}")
+    return {f_id: names.get(f_id) or "Unknown Folder" for f_id in folder_ids}
+
+
+# Page size limits for list_files / search_files
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+def _resolve_folders(service, folder_id, folder_name):
+    """
+    Folder IDs the user asked for, or a message to return instead
+    (folder not found, or no folder given so the user should pick one).
+    """
     if folder_name:
-        target_folder_id = find_folder_by_name(service, folder_name)
+        target_folder_id = find_folder_by_name(service, folder_name, index=drive_index)
         if not target_folder_id:
-            folders = get_first_5_folders_with_names(service)
-            folder_names = [f.get("name", "Unknown") for f in folders]
-            return f"Folder '{folder_name}' not found. Available folders: {', '.join(folder_names)}"
-        folder_ids = [target_folder_id]
-    elif folder_id:
-        folder_ids = [folder_id]
+            # Suggest folders starting with the given name, or the first 5 folders
+            folder_names = suggest_folders(service, folder_name, index=drive_index)
+            if not folder_names:
+                folder_names = [f.get("name", "Unknown") for f in get_first_5_folders_with_names(service)]
+            return None, f"Folder '{folder_name}' not found. Available folders: {', '.join(folder_names)}"
+        return [target_folder_id], None
+    if folder_id:
+        return [folder_id], None
+
+    # No folder specified → list the first 5 folders for user to choose
+    folders = get_first_5_folders_with_names(service)
+    if not folders:
+        return None, "No folders found in Google Drive."
+    result_text = "First 5 folders:\n\n"
+    for f in folders:
+        result_text += f"- {f.get('name', 'Unknown')} (ID: {f['id']})\n"
+    result_text += "\nPlease pick a folder by providing its name or ID."
+    return None, result_text
+
+
+def _expand_folders(folder_ids, recursive):
+    """The folders to query: the given ones, plus every subfolder when recursive."""
+    if not recursive:
+        return list(folder_ids)
+    if _index_ready():
+        subfolders = drive_index.subfolders(folder_ids, max_folders=MAX_RECURSIVE_FOLDERS)
     else:
-        # No folder specified → list the first 5 folders for user to choose
-        folders = get_first_5_folders_with_names(service)
-        if not folders:
-            return "No folders found in Google Drive."
-        result_text = "First 5 folders:\n\n"
-        for f in folders:
-            result_text += f"- {f.get('name', 'Unknown')} (ID: {f['id']})\n"
-        result_text += "\nPlease pick a folder by providing its name or ID."
-        return result_text
+        subfolders = list_subfolders(folder_ids)
+    return list(folder_ids) + [f["id"] for f in subfolders]
 
-    # Now list files in the chosen folder(s)
-    results_text = []
-    for f_id in folder_ids[:5]:
+
+def _format_page(service, folder_ids, files, next_state, recursive):
+    folder_names = _folder_display_names(service, folder_ids)
+    header = ", ".join(folder_names[f_id] for f_id in folder_ids)
+    results_text = [f"\n📁 Folder: {header}{' (including subfolders)' if recursive else ''}\n"]
+    for f in files:
+        results_text.append(
+            f"- {f['name']} (ID: {f['id']}, Type: {f['mimeType']}, Modified: {f['modifiedTime']})"
+        )
+    if next_state:
+        results_text.append(f"\nMore results available. Call again with page_token='{encode_cursor(next_state)}'")
+    return "\n".join(results_text)
+
+
+@mcp.tool()
+@offload
+@tool_cache.cached(_index_generation, is_error=_is_error_result)
+def list_files(folder_id: str = None, folder_name: str = None, page_token: str = None,
+               page_size: int = DEFAULT_PAGE_SIZE, recursive: bool = False) -> str:
+    """
+    List files in a specific folder or let the user pick from first 5 folders.
+    Results are sorted by name and paginated: pass the returned page_token to get the next page.
+    Set recursive=True to include files in subfolders.
+    """
+    service = get_drive_service()
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    if page_token:
         try:
-            results = service.files().list(
-                q=f"'{f_id}' in parents and trashed=false",
-                pageSize=10,
-                fields="files(id, name, mimeType, modifiedTime)"
-            ).execute()
-            files = results.get("files", [])
-            folder_name_display = next(
-                (f.get("name") for f in get_first_5_folders_with_names(service) if f["id"] == f_id),
-                "Unknown Folder"
-            )
-            results_text.append(f"\n📁 Folder: {folder_name_display}\n")
-            for f in files:
-                results_text.append(
-                    f"- {f['name']} (ID: {f['id']}, Type: {f['mimeType']}, Modified: {f['modifiedTime']})"
-                )
-        except Exception as e:
-            results_text.append(f"⚠️ Error listing files in folder {f_id}: {e}")
+            cursor = decode_cursor(page_token)
+        except ValueError as e:
+            return str(e)
+        folder_ids, recursive = cursor["folders"], cursor["recursive"]
+    else:
+        folder_ids, message = _resolve_folders(service, folder_id, folder_name)
+        if message:
+            return message
+        cursor = {"mode": "index" if _index_ready() else "drive", "offset": 0, "state": None}
 
-    return "\n".join(results_text) if results_text else "No files found."
+    # A page_token continues in the mode it was issued in, even if index readiness changed since
+    if cursor["mode"] == "index" and not _index_ready():
+        return f"Expired page_token: {page_token}. Please list the folder again without a page_token."
+
+    try:
+        if cursor["mode"] == "index":
+            offset = cursor["offset"]
+            scope = _expand_folders(folder_ids, recursive)
+            # Fetch one extra row to know whether another page exists
+            files = drive_index.list_folders(scope, limit=page_size + 1, offset=offset)
+            next_state = None
+            if len(files) > page_size:
+                files = files[:page_size]
+                next_state = {"mode": "index", "folders": folder_ids, "recursive": recursive, "offset": offset + page_size}
+        else:
+            # Query every folder concurrently and merge the results by name
+            state = cursor["state"] or {f_id: [None, 0] for f_id in _expand_folders(folder_ids, recursive)}
+            files, drive_state = list_folders_page(list(state), page_size=page_size, state=state)
+            next_state = {"mode": "drive", "folders": folder_ids, "recursive": recursive, "state": drive_state} if drive_state else None
+    except Exception as e:
+        return f"⚠️ Error listing files in folder(s) {', '.join(folder_ids)}: {e}"
+
+    if not files:
+        return "No files found."
+    return _format_page(service, folder_ids, files, next_state, recursive)
 
 
 @mcp.tool()
-def search_files(query: str, folder_id: str = None, folder_name: str = None) -> str:
+@offload
+@tool_cache.cached(_index_generation, is_error=_is_error_result)
+def search_files(query: str, folder_id: str = None, folder_name: str = None, page_token: str = None,
+                 page_size: int = DEFAULT_PAGE_SIZE, recursive: bool = False) -> str:
     """
     Search for files with a query in a specific folder or let the user pick from first 5 folders.
-    Returns up to 10 matching files per folder.
+    Results are sorted by name and paginated: pass the returned page_token to get the next page.
+    Set recursive=True to search subfolders too.
     """
     service = get_drive_service()
-    folder_ids = []
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
 
-    if folder_name:
-        target_folder_id = find_folder_by_name(service, folder_name)
-        if not target_folder_id:
-            folders = get_first_5_folders_with_names(service)
-            folder_names = [f.get("name", "Unknown") for f in folders]
-            return f"Folder '{folder_name}' not found. Available folders: {', '.join(folder_names)}"
-        folder_ids = [target_folder_id]
-    elif folder_id:
-        folder_ids = [folder_id]
+    if page_token:
+        try:
+            cursor = decode_cursor(page_token)
+        except ValueError as e:
+            return str(e)
+        folder_ids, recursive, query = cursor["folders"], cursor["recursive"], cursor["query"]
     else:
-        # No folder specified → list first 5 folders for user
-        folders = get_first_5_folders_with_names(service)
-        if not folders:
-            return "No folders found in Google Drive."
-        result_text = "First 5 folders:\n\n"
-        for f in folders:
-            result_text += f"- {f.get('name', 'Unknown')} (ID: {f['id']})\n"
-        result_text += "\nPlease pick a folder by providing its name or ID."
-        return result_text
+        folder_ids, message = _resolve_folders(service, folder_id, folder_name)
+        if message:
+            return message
+        cursor = {"mode": "index" if _index_ready() else "drive", "offset": 0, "state": None}
 
-    # Search in chosen folder(s)
-    results_text = []
-    total_files = 0
-    for f_id in folder_ids[:5]:
-        try:
-            full_query = f"'{f_id}' in parents and (name contains '{query}' or fullText contains '{query}') and trashed=false"
-            results = service.files().list(
-                q=full_query,
-                pageSize=10,
-                fields="files(id, name, mimeType, modifiedTime)"
-            ).execute()
-            files = results.get("files", [])
-            if files:
-                total_files += len(files)
-                folder_name_display = next(
-                    (f.get("name") for f in get_first_5_folders_with_names(service) if f["id"] == f_id),
-                    "Unknown Folder"
+    try:
+        scope = _expand_folders(folder_ids, recursive)
+        files = []
+        next_state = None
+        base = {"folders": folder_ids, "recursive": recursive, "query": query}
+
+        if cursor["mode"] == "index" and _index_ready():
+            # Phase 1: name matches from the local index
+            offset = cursor["offset"]
+            files = drive_index.search_by_name(query, folder_ids=scope, limit=page_size + 1, offset=offset)
+            if len(files) > page_size:
+                return _format_page(
+                    service, folder_ids, files[:page_size],
+                    {**base, "mode": "index", "offset": offset + page_size}, recursive
                 )
-                results_text.append(f"\n📁 Folder: {folder_name_display}\n")
-                for f in files:
-                    results_text.append(
-                        f"- {f['name']} (ID: {f['id']}, Type: {f['mimeType']}, Modified: {f['modifiedTime']})"
-                    )
-        except Exception as e:
-            results_text.append(f"⚠️ Error searching in folder {f_id}: {e}")
+            # Name matches exhausted: fill the rest of the page with content matches from Drive
+            cursor = {"mode": "content", "state": None}
+            if len(files) == page_size:
+                return _format_page(service, folder_ids, files, {**base, **cursor}, recursive)
+
+        if cursor["mode"] in ("content", "index"):
+            # Phase 2 (index ready): only content matches, skipping files already returned by name
+            name_matches = {f["id"] for f in drive_index.search_by_name(query, folder_ids=scope)} if _index_ready() else set()
+            extra_query = f"fullText contains '{escape_query(query)}'"
+            mode = "content"
+        else:
+            extra_query = f"name contains '{escape_query(query)}' or fullText contains '{escape_query(query)}'"
+            name_matches = set()
+            mode = "drive"
+
+        # Query every folder concurrently and merge the results by name
+        state = cursor["state"] or {f_id: [None, 0] for f_id in scope}
+        remaining = page_size - len(files)
+        matches, drive_state = list_folders_page(list(state), extra_query=extra_query, page_size=remaining, state=state)
+        files += [f for f in matches if f["id"] not in name_matches]
+        if drive_state:
+            next_state = {**base, "mode": mode, "state": drive_state}
+    except Exception as e:
+        return f"⚠️ Error searching in folder(s) {', '.join(folder_ids)}: {e}"
 
-    return "\n".join(results_text) if results_text else f"No files found matching '{query}'"
+    if not files:
+        return f"No files found matching '{query}'"
+    return _format_page(service, folder_ids, files, next_state, recursive)
 
 @mcp.tool()
+@offload
+@tool_cache.cached(_index_generation, is_error=_is_error_result)
 def get_target_folders() -> str:
     """
     Get the first 5 folders from Google Drive that are being used for file operations.
@@ -129,21 +366,14 @@ def get_target_folders() -> str:
     if not folders:
         return "No folders found in Google Drive."
     
-    # Use cached folder names, but get modifiedTime if needed (one API call per folder)
+    # Use cached folder names; fetch fresh modifiedTime for all folders in one batch request
     try:
+        modified = get_files_metadata(service, [f["id"] for f in folders], fields="id, modifiedTime")
         result_text = "Target folders (first 5 folders for API credit optimization):\n\n"
         for folder in folders:
             folder_id = folder["id"]
             folder_name = folder.get("name", "Unknown")
-            # Get modifiedTime (requires API call, but we cache the rest)
-            try:
-                folder_info = service.files().get(
-                    fileId=folder_id,
-                    fields="modifiedTime"
-                ).execute()
-                modified_time = folder_info.get('modifiedTime', 'N/A')
-            except:
-                modified_time = 'N/A'
+            modified_time = modified.get(folder_id, {}).get('modifiedTime', 'N/A')
             
             result_text += f"ID: {folder_id}\n"
             result_text += f"Name: {folder_name}\n"
@@ -158,98 +388,308 @@ def get_target_folders() -> str:
         return result_text
 
 
+# Metadata fields needed to read a file and check its cached version
+FILE_META_FIELDS = "id, name, mimeType, modifiedTime, md5Checksum"
+
+
+def _extract_and_cache(service, file, version):
+    with span("extract_text"):
+        text = extract_text(service, file)
+    if text is not None:
+        content_cache.put(file["id"], version, text)
+    return text
+
+
+def get_file_text(service, file):
+    """
+    Extracted text of a file, served from the content cache when the cached
+    version matches the file's current modifiedTime/md5Checksum.
+    Returns None for unsupported file types.
+    """
+    version = file_version(file)
+    text = content_cache.get(file["id"], version)
+    if text is None:
+        # Concurrent readers of the same file version share one download and extraction
+        text = single_flight(("extract_text", file["id"], version), lambda: _extract_and_cache(service, file, version))
+    if text is not None and not content_index.is_indexed(file["id"], version):
+        with span("content_indexing"):
+            content_index.add(file["id"], version, file["name"], text)
+    return text
+
+
+def _load_google_doc(service, file_id, file=None):
+    """(file, text) for a Google Doc, or (None, message) with a message to return instead."""
+    if file is None:
+        file = _file_metadata(service, file_id)
+    mime = file["mimeType"]
+    if mime != "application/vnd.google-apps.document":
+        # For non-Google Docs, just return metadata for now
+        return None, f"File: {file['name']} (type: {mime})\n\nContent preview not supported yet."
+    return file, get_file_text(service, file)
+
+
 @mcp.tool()
-def get_file(file_id: str) -> str:
-    """Read a Google Drive file by ID (Google Docs or plain text)."""
+@offload
+@tool_cache.cached(_file_modified, is_error=_is_error_result)
+def get_file(file_id: str, chunk: int = 0, offset: int = None, length: int = None) -> str:
+    """
+    Read a Google Drive file by ID (Google Docs or plain text).
+    Large files are returned one chunk at a time: pass chunk=N for the next section,
+    or offset/length to read an exact character range. Use get_file_outline to see
+    a file's size and which chunk each heading is in.
+    """
     service = get_drive_service()
-    file = service.files().get(fileId=file_id, fields="id, name, mimeType").execute()
-    mime = file["mimeType"]
+    file, text = _load_google_doc(service, file_id)
+    if file is None:
+        return text
 
-    # Handle Google Docs (convert to plain text)
-    if mime == "application/vnd.google-apps.document":
-        from googleapiclient.http import MediaIoBaseDownload
-        import io
+    total = len(text)
+    if offset is not None:
+        start = max(0, min(offset, total))
+        end = min(total, start + max(1, length or FILE_CHUNK_CHARS))
+        result = f"File: {file['name']} (characters {start}-{end} of {total})\n\n{text[start:end]}"
+        if end < total:
+            result += f"\n\n[More text available. Call get_file with offset={end}]"
+        return result
 
-        request = service.files().export_media(fileId=file_id, mimeType="text/plain")
-        fh = io.BytesIO()
-        downloader = MediaIoBaseDownload(fh, request)
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-        fh.seek(0)
-        return f"File: {file['name']}\n\n{fh.read().decode('utf-8')}"
+    bounds = chunk_index.get(file["id"], file_version(file), text)["bounds"]
+    if len(bounds) == 1:
+        return f"File: {file['name']}\n\n{text}"
+    if not 0 <= chunk < len(bounds):
+        return f"Chunk {chunk} out of range: {file['name']} has chunks 0-{len(bounds) - 1}."
+
+    start, end = bounds[chunk]
+    result = f"File: {file['name']} (chunk {chunk} of 0-{len(bounds) - 1}, characters {start}-{end} of {total})\n\n{text[start:end]}"
+    if chunk + 1 < len(bounds):
+        result += f"\n\n[More text available. Call get_file with chunk={chunk + 1}]"
+    return result
 
-    else:
-        # For non-Google Docs, just return metadata for now
-        return f"File: {file['name']} (type: {mime})\n\nContent preview not supported yet."
 
 @mcp.tool()
-def summarize_file(file_id: str) -> str:
+@offload
+@tool_cache.cached(_file_modified, is_error=_is_error_result)
+def get_file_outline(file_id: str) -> str:
     """
-    Fetch a file from Google Drive and return the first 100 characters of text.
-    Supports Google Docs, .txt, .md, and .docx.
+    Size and outline of a Google Drive file: character/token estimates, number of chunks,
+    and the headings in each chunk. Use it to pick which chunks to read with get_file.
     """
     service = get_drive_service()
-    
-    # Get file metadata
-    file = service.files().get(fileId=file_id, fields="id, name, mimeType").execute()
+    file, text = _load_google_doc(service, file_id)
+    if file is None:
+        return text
+
+    entry = chunk_index.get(file["id"], file_version(file), text)
+    bounds = entry["bounds"]
+    lines = [
+        f"File: {file['name']}",
+        f"Size: {len(text)} characters (~{len(text) // 4} tokens), {len(bounds)} chunk(s) of up to {FILE_CHUNK_CHARS} characters",
+        "",
+    ]
+    headings = {}
+    for chunk, title in entry["headings"]:
+        headings.setdefault(chunk, []).append(title)
+    for i, (start, end) in enumerate(bounds):
+        first_line = next((l.strip() for l in text[start:end].split("\n") if l.strip()), "")
+        lines.append(f"Chunk {i} (characters {start}-{end}): {first_line[:80]}")
+        for title in headings.get(i, [])[:10]:
+            lines.append(f"  - {title}")
+    return "\n".join(lines)
+
+
+def _file_preview(service, file, max_chars):
+    """summarize_file output for one file (given its FILE_META_FIELDS metadata)."""
     mime = file["mimeType"]
     file_name = file["name"]
-    text = ""
-
-    from googleapiclient.http import MediaIoBaseDownload
-    import io
 
     try:
-        # Google Docs
-        if mime == "application/vnd.google-apps.document":
-            request = service.files().export_media(fileId=file_id, mimeType="text/plain")
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            fh.seek(0)
-            text = fh.read().decode("utf-8")
-
-        # Plain text or Markdown
-        elif mime == "text/plain" or file_name.lower().endswith(".md"):
-            request = service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            fh.seek(0)
-            text = fh.read().decode("utf-8")
-
-        # DOCX - Fixed condition check
-        elif (mime == "application/vnd.openxmlformats-officedocument.wordprocessingml.document" or 
-              file_name.lower().endswith(".docx")):
-            from docx import Document
-            request = service.files().get_media(fileId=file_id)
-            fh = io.BytesIO()
-            downloader = MediaIoBaseDownload(fh, request)
-            done = False
-            while not done:
-                _, done = downloader.next_chunk()
-            fh.seek(0)
-            doc = Document(fh)
-            text = "\n".join([p.text for p in doc.paragraphs])
+        # Use the full cached text if we have it, otherwise stream just the beginning of the file
+        text = content_cache.get(file["id"], file_version(file))
+        if text is None:
+            with span("extract_preview"):
+                text = extract_preview(service, file, max_chars)
 
         # Unsupported file types
-        else:
+        if text is None:
             return f"File type not supported for summarization: {file_name} (MIME type: {mime})"
 
-        # Truncate to first 100 characters
-        truncated_text = text[:100].replace("\n", " ").strip()
-        return f"File: {file_name}\nFirst 100 characters:\n{truncated_text}"
+        # Truncate to first max_chars characters
+        truncated_text = text[:max_chars].replace("\n", " ").strip()
+        return f"File: {file_name}\nFirst {max_chars} characters:\n{truncated_text}"
 
     except Exception as e:
         return f"Error reading file {file_name}: {str(e)}"
+
+
+@mcp.tool()
+@offload
+@tool_cache.cached(_file_modified, is_error=_is_error_result)
+def summarize_file(file_id: str, max_chars: int = SUMMARY_PREVIEW_CHARS) -> str:
+    """
+    Fetch a file from Google Drive and return the first `max_chars` characters of text
+    (100 by default). Supports Google Docs, .txt, .md, and .docx.
+    """
+    service = get_drive_service()
+    max_chars = max(1, max_chars)
     
+    # Get file metadata (cheap call, also used to check the content cache)
+    file = _file_metadata(service, file_id)
+    return _file_preview(service, file, max_chars)
+
+
+# Most file IDs accepted by get_files / summarize_files in one call
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "10"))
+
+# Default total characters of file text returned by get_files
+BATCH_MAX_CHARS = int(os.getenv("BATCH_MAX_CHARS", "12000"))
+
+BATCH_SEPARATOR = "\n\n---\n\n"
+
+
+def _allocate_budget(lengths, budget):
+    """Split `budget` characters across texts: short texts get all they need, long ones share the rest equally."""
+    allowance = [0] * len(lengths)
+    remaining = budget
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    for n, i in enumerate(order):
+        allowance[i] = min(lengths[i], remaining // (len(order) - n))
+        remaining -= allowance[i]
+    return allowance
+
+
+def _batch_metadata(service, file_ids):
+    """Deduplicated IDs and their metadata (one batch request), or a message if too many IDs."""
+    file_ids = list(dict.fromkeys(file_ids))
+    if not file_ids:
+        return None, None, "No file IDs given."
+    if len(file_ids) > MAX_BATCH_FILES:
+        return None, None, f"Too many files: pass at most {MAX_BATCH_FILES} file IDs per call."
+    prefetched = _prefetched_metadata.get()
+    if prefetched is not None and set(file_ids) <= set(prefetched):
+        return file_ids, {f_id: prefetched[f_id] for f_id in file_ids if prefetched[f_id] is not None}, None
+    return file_ids, get_files_metadata(service, file_ids, fields=FILE_META_FIELDS), None
+
+
+@mcp.tool()
+@offload
+@tool_cache.cached(_files_modified, is_error=_is_error_result)
+def get_files(file_ids: list[str], max_chars: int = BATCH_MAX_CHARS) -> str:
+    """
+    Read several Google Drive files (Google Docs) in one call, e.g. to compare them.
+    Files are fetched concurrently and share a budget of `max_chars` characters;
+    truncated files say which get_file offset to continue from.
+    """
+    service = get_drive_service()
+    file_ids, metadata, message = _batch_metadata(service, file_ids)
+    if message:
+        return message
+
+    def load(file_id):
+        file = metadata.get(file_id)
+        if file is None:
+            return None, f"File {file_id}: not found or not accessible."
+        try:
+            # Worker threads use their own Drive service
+            return _load_google_doc(get_drive_service(), file_id, file)
+        except Exception as e:
+            return None, f"Error reading file {file['name']}: {str(e)}"
+
+    loaded = fan_out(load, file_ids)
+    allowance = _allocate_budget([len(text) if file else 0 for file, text in loaded], max(1, max_chars))
+    sections = []
+    for (file, text), limit in zip(loaded, allowance):
+        if file is None:
+            sections.append(text)
+            continue
+        section = f"File: {file['name']} (ID: {file['id']})\n\n{text[:limit]}"
+        if limit < len(text):
+            section += (f"\n\n[Truncated at {limit} of {len(text)} characters. "
+                        f"Call get_file with file_id='{file['id']}' and offset={limit} for more]")
+        sections.append(section)
+    return BATCH_SEPARATOR.join(sections)
+
+
+@mcp.tool()
+@offload
+@tool_cache.cached(_files_modified, is_error=_is_error_result)
+def summarize_files(file_ids: list[str], max_chars: int = SUMMARY_PREVIEW_CHARS) -> str:
+    """
+    Return the first `max_chars` characters (100 by default) of several files in one call.
+    Files are fetched concurrently. Supports Google Docs, .txt, .md, and .docx.
+    """
+    service = get_drive_service()
+    max_chars = max(1, max_chars)
+    file_ids, metadata, message = _batch_metadata(service, file_ids)
+    if message:
+        return message
+
+    def preview(file_id):
+        file = metadata.get(file_id)
+        if file is None:
+            return f"File {file_id}: not found or not accessible."
+        return _file_preview(get_drive_service(), file, max_chars)
+
+    return BATCH_SEPARATOR.join(fan_out(preview, file_ids))
+
+@mcp.tool()
+@offload
+def search_content(query: str, limit: int = 5) -> str:
+    """
+    Ranked full-text search (BM25) over the text of files that have already been read
+    (get_file, get_files). Returns the best matching files with a snippet and the
+    chunk to read with get_file. Answers locally; use search_files to search all of Drive.
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    results = []
+    with span("content_search"):
+        hits = content_index.search(query, limit=limit * 2)
+    for hit in hits:
+        # Drop files that have since been deleted or trashed in Drive
+        if _index_ready() and drive_index.get(hit["id"]) is None:
+            content_index.remove(hit["id"])
+            continue
+        results.append(hit)
+        if len(results) >= limit:
+            break
+
+    if not results:
+        return f"No indexed file content matches '{query}'. Try search_files to search Drive."
+    lines = [f"Top {len(results)} matches for '{query}':\n"]
+    for hit in results:
+        lines.append(f"- {hit['name']} (ID: {hit['id']}, chunk {hit['chunk']}, score {hit['score']:.2f})\n  {hit['snippet']}")
+    return "\n".join(lines)
+
+
+@mcp.resource("drive-state://version", name="drive-state", description="Version of the Drive metadata index", mime_type="application/json")
+def drive_state() -> str:
+    """
+    Changes whenever the metadata index picks up a change in Drive, and never repeats
+    across restarts (it's the persisted Drive changes token); clients use it to
+    invalidate their own caches. Empty version while the index is disabled or syncing.
+    """
+    return json.dumps({"version": drive_index.version if _index_ready() else None})
+
+
+@mcp.resource("drive-state://files/{file_ids}", name="drive-file-versions", description="Current versions of files (comma-separated IDs)", mime_type="application/json")
+async def drive_file_versions(file_ids: str) -> str:
+    """
+    Live modifiedTime/md5Checksum version of each file, from one batch metadata request.
+    Files that can't be read are left out. Clients record these to invalidate results
+    built from file content as soon as a file is edited.
+    """
+    ids = [f_id for f_id in file_ids.split(",") if f_id]
+    # get_drive_service() runs on the pool thread so it gets that thread's own service
+    metadata = await run_blocking(lambda: get_files_metadata(get_drive_service(), ids, fields=FILE_META_FIELDS))
+    return json.dumps({"versions": {f_id: file_version(meta) for f_id, meta in metadata.items()}})
+
+
 @mcp.resource("drive://{file_id}", name="drive-file", description="Read a file by ID", mime_type="text/plain")
-def get_file_resource(file_id: str) -> str:
-    """Return raw file content from Google Drive."""
-    return get_file(file_id)
+async def get_file_resource(file_id: str) -> str:
+    """Return raw file content from Google Drive (first chunk for large files)."""
+    return await get_file(file_id)
+
+
+@mcp.resource("drive://{file_id}/chunk/{chunk}", name="drive-file-chunk", description="Read one chunk of a file by ID", mime_type="text/plain")
+async def get_file_chunk_resource(file_id: str, chunk: int) -> str:
+    """Return one chunk of a file's content from Google Drive."""
+    return await get_file(file_id, chunk=int(chunk))
 
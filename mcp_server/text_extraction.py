@@ -0,0 +1,221 @@
+"""
+Text extraction for Drive files.
+extract_text() downloads a whole file and returns all of its text.
+extract_preview() streams the file in small chunks and stops downloading as soon
+as enough text is available; .docx files are read by walking the zip stream and
+incrementally parsing word/document.xml instead of loading the whole document.
+"""
+import io
+import os
+import zlib
+import codecs
+import struct
+import xml.etree.ElementTree as ET
+from drive_calls import call_with_retry
+
+# Size of each ranged request when streaming a file for a preview
+PREVIEW_CHUNK_SIZE = int(os.getenv("PREVIEW_CHUNK_SIZE", str(256 * 1024)))
+
+GOOGLE_DOC_MIME = "application/vnd.google-apps.document"
+DOCX_MIME = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+ZIP_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+ZIP_LOCAL_SIGNATURE = 0x04034b50
+
+
+def _kind(file):
+    """Which extraction path a file takes: 'gdoc', 'text', 'docx' or None."""
+    mime = file["mimeType"]
+    name = file["name"].lower()
+    if mime == GOOGLE_DOC_MIME:
+        return "gdoc"
+    if mime == "text/plain" or name.endswith(".md"):
+        return "text"
+    if mime == DOCX_MIME or name.endswith(".docx"):
+        return "docx"
+    return None
+
+
+def _media_request(service, file):
+    if _kind(file) == "gdoc":
+        return service.files().export_media(fileId=file["id"], mimeType="text/plain")
+    return service.files().get_media(fileId=file["id"])
+
+
+def _download(request):
+    """Run a media download request to completion and return the bytes."""
+    from googleapiclient.http import MediaIoBaseDownload
+
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, request)
+    done = False
+    while not done:
+        _, done = call_with_retry(downloader.next_chunk)
+    return fh.getvalue()
+
+
+def iter_media_chunks(request, chunksize=PREVIEW_CHUNK_SIZE):
+    """
+    Yield a media download piece by piece (ranged requests of `chunksize` bytes).
+    Stopping iteration early means the rest of the file is never requested.
+    """
+    from googleapiclient.http import MediaIoBaseDownload
+
+    fh = io.BytesIO()
+    downloader = MediaIoBaseDownload(fh, request, chunksize=chunksize)
+    done = False
+    while not done:
+        _, done = call_with_retry(downloader.next_chunk)
+        data = fh.getvalue()
+        fh.seek(0)
+        fh.truncate()
+        if data:
+            yield data
+
+
+def preload():
+    """Import the download and .docx libraries now instead of on the first extraction."""
+    import googleapiclient.http  # noqa: F401
+    import docx  # noqa: F401
+
+
+def extract_text(service, file):
+    """
+    Download a file and extract its text.
+    Supports Google Docs, .txt, .md, and .docx; returns None for other types.
+    """
+    kind = _kind(file)
+    if kind is None:
+        return None
+
+    data = _download(_media_request(service, file))
+    if kind == "docx":
+        from docx import Document
+        doc = Document(io.BytesIO(data))
+        return "\n".join([p.text for p in doc.paragraphs])
+    return data.decode("utf-8")
+
+
+def _text_preview(chunks, max_chars):
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    parts = []
+    length = 0
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        parts.append(text)
+        length += len(text)
+        if length >= max_chars:
+            break
+    return "".join(parts)[:max_chars]
+
+
+class _StreamReader:
+    """Byte reader over an iterator of chunks."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def read(self, n):
+        while len(self._buffer) < n:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def skip(self, n):
+        while n > 0:
+            data = self.read(min(n, PREVIEW_CHUNK_SIZE))
+            if not data:
+                return
+            n -= len(data)
+
+    def iter_rest(self):
+        if self._buffer:
+            yield self._buffer
+            self._buffer = b""
+        yield from self._chunks
+
+
+def _document_xml_text(pieces, max_chars):
+    """Incrementally parse word/document.xml, collecting paragraph text until max_chars."""
+    parser = ET.XMLPullParser(events=("end",))
+    paragraphs = []
+    current = []
+    length = 0
+    for piece in pieces:
+        parser.feed(piece)
+        for _, elem in parser.read_events():
+            if elem.tag == WORD_NS + "t":
+                current.append(elem.text or "")
+            elif elem.tag == WORD_NS + "tab":
+                current.append("\t")
+            elif elem.tag == WORD_NS + "p":
+                paragraph = "".join(current)
+                paragraphs.append(paragraph)
+                length += len(paragraph) + 1
+                current = []
+                elem.clear()
+                if length >= max_chars:
+                    return "\n".join(paragraphs)
+    return "\n".join(paragraphs)
+
+
+def _docx_preview(chunks, max_chars):
+    """
+    Walk the .docx zip stream entry by entry until word/document.xml, then
+    inflate and parse only as much of it as needed.
+    Returns None if the stream can't be walked (e.g. sizes only in data descriptors).
+    """
+    reader = _StreamReader(chunks)
+    while True:
+        header = reader.read(ZIP_LOCAL_HEADER.size)
+        if len(header) < ZIP_LOCAL_HEADER.size:
+            return None
+        (signature, _, flags, method, _, _, _, comp_size, _, name_len, extra_len) = ZIP_LOCAL_HEADER.unpack(header)
+        if signature != ZIP_LOCAL_SIGNATURE:
+            # Reached the central directory without finding the document
+            return None
+        name = reader.read(name_len).decode("utf-8", "replace")
+        reader.read(extra_len)
+
+        if name == "word/document.xml":
+            if method == 8:
+                inflater = zlib.decompressobj(-zlib.MAX_WBITS)
+
+                def pieces():
+                    for chunk in reader.iter_rest():
+                        yield inflater.decompress(chunk)
+                        if inflater.eof:
+                            return
+                return _document_xml_text(pieces(), max_chars)
+            if method == 0 and not flags & 0x08:
+                return _document_xml_text([reader.read(comp_size)], max_chars)
+            return None
+
+        # Sizes live in a trailing data descriptor (or zip64 extra), so the entry can't be skipped
+        if flags & 0x08 or comp_size == 0xFFFFFFFF:
+            return None
+        reader.skip(comp_size)
+
+
+def extract_preview(service, file, max_chars):
+    """
+    The first `max_chars` characters of a file's text, downloading only as much as needed.
+    Supports the same types as extract_text(); returns None for other types.
+    """
+    kind = _kind(file)
+    if kind is None:
+        return None
+
+    chunks = iter_media_chunks(_media_request(service, file))
+    if kind == "docx":
+        text = _docx_preview(chunks, max_chars)
+        if text is None:
+            # Unusual zip layout: fall back to a full download and parse
+            text = extract_text(service, file)
+        return text[:max_chars]
+    return _text_preview(chunks, max_chars)
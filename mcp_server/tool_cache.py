@@ -0,0 +1,102 @@
+"""
+In-memory cache of tool results.
+Entries are keyed by tool name, normalized arguments and a version key for the
+Drive data the result depends on (a file's modifiedTime, or the metadata index
+generation for listings), so a change in Drive is simply a cache miss.
+Tools whose version can't be determined cheaply are not cached.
+"""
+import os
+import json
+import time
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+
+# Seconds a cached tool result stays valid (even if Drive hasn't changed)
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", "600"))
+
+# Max total characters of cached results
+TOOL_CACHE_MAX_CHARS = int(os.getenv("TOOL_CACHE_MAX_CHARS", str(20 * 1000 * 1000)))
+
+
+class ToolResultCache:
+    """Size-bounded LRU cache of tool result strings with a TTL."""
+
+    def __init__(self, ttl=TOOL_CACHE_TTL, max_chars=TOOL_CACHE_MAX_CHARS):
+        self.ttl = ttl
+        self.max_chars = max_chars
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, result)
+        self._chars = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, result):
+        if len(result) > self.max_chars:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), result)
+            self._chars += len(result)
+            while self._chars > self.max_chars:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        _, result = self._entries.pop(key)
+        self._chars -= len(result)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+
+    def cached(self, version, is_error=None):
+        """
+        Decorator for a sync tool function. `version(**arguments)` returns the version
+        key of the Drive data the call depends on, or None to skip the cache.
+        Results for which `is_error(result)` is true are not stored.
+        """
+        def decorator(fn):
+            signature = inspect.signature(fn)
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                version_key = version(**bound.arguments)
+                if version_key is None:
+                    return fn(*args, **kwargs)
+
+                key = (fn.__name__, json.dumps(bound.arguments, sort_keys=True, default=str), version_key)
+                result = self.get(key)
+                if result is None:
+                    result = fn(*args, **kwargs)
+                    if isinstance(result, str) and not (is_error and is_error(result)):
+                        self.put(key, result)
+                return result
+            return wrapper
+        return decorator
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "chars": self._chars,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,76 @@
+"""
+Runs blocking Drive tool bodies off the event loop.
+Tools decorated with @offload become async handlers that execute on a bounded
+thread pool (each pool thread has its own Drive service, see drive_utils).
+A semaphore caps concurrent tool calls; extra calls wait in a bounded queue
+and are rejected once the queue is full.
+"""
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from fastmcp.exceptions import ToolError
+
+# Threads available for blocking Drive work
+DRIVE_TOOL_WORKERS = int(os.getenv("DRIVE_TOOL_WORKERS", "16"))
+
+# Tool calls allowed to run at once (the rest queue)
+MCP_MAX_CONCURRENT_TOOLS = int(os.getenv("MCP_MAX_CONCURRENT_TOOLS", str(DRIVE_TOOL_WORKERS)))
+
+# Tool calls allowed to wait for a slot before new ones are rejected
+MCP_MAX_QUEUED_TOOLS = int(os.getenv("MCP_MAX_QUEUED_TOOLS", "200"))
+
+_executor = ThreadPoolExecutor(max_workers=DRIVE_TOOL_WORKERS, thread_name_prefix="drive-tool")
+_semaphore = None
+_queued = 0
+_running = 0
+
+
+def _get_semaphore():
+    # Created lazily so it binds to the server's running event loop
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(MCP_MAX_CONCURRENT_TOOLS)
+    return _semaphore
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run `fn(*args, **kwargs)` on the Drive thread pool, honoring the concurrency limit."""
+    global _queued, _running
+    if _queued >= MCP_MAX_QUEUED_TOOLS:
+        raise ToolError("Server busy: too many queued Drive requests, please retry shortly.")
+
+    _queued += 1
+    try:
+        await _get_semaphore().acquire()
+    finally:
+        _queued -= 1
+
+    _running += 1
+    try:
+        loop = asyncio.get_running_loop()
+        # Carry context variables (e.g. the request ID) over to the pool thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(_executor, functools.partial(context.run, fn, *args, **kwargs))
+    finally:
+        _running -= 1
+        _get_semaphore().release()
+
+
+def offload(fn):
+    """Turn a blocking tool function into an async one that runs via run_blocking()."""
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_blocking(fn, *args, **kwargs)
+    return wrapper
+
+
+def stats():
+    return {
+        "running": _running,
+        "queued": _queued,
+        "max_concurrent": MCP_MAX_CONCURRENT_TOOLS,
+        "max_queued": MCP_MAX_QUEUED_TOOLS,
+        "workers": DRIVE_TOOL_WORKERS,
+    }
@@ -0,0 +1,37 @@
+"""
+FastMCP middleware that times every tool call into mcp_tool_seconds and
+carries the backend's request ID from the call's _meta into request_id_var.
+"""
+import time
+from fastmcp.server.middleware import Middleware
+from metrics import TOOL_SECONDS, TRACE_SPANS, request_id_var, current_request_id
+
+
+def _meta_request_id(context):
+    """Request ID the caller put in the tool call's _meta, if any."""
+    try:
+        meta = context.fastmcp_context.request_context.meta
+    except Exception:
+        return None
+    if isinstance(meta, dict):
+        return meta.get("request_id")
+    return getattr(meta, "request_id", None)
+
+
+class ToolMetricsMiddleware(Middleware):
+    """Times every tool call and picks up the caller's request ID from _meta."""
+
+    async def on_call_tool(self, context, call_next):
+        token = request_id_var.set(_meta_request_id(context))
+        status = "error"
+        start = time.perf_counter()
+        try:
+            result = await call_next(context)
+            status = "ok"
+            return result
+        finally:
+            elapsed = time.perf_counter() - start
+            TOOL_SECONDS.labels(tool=context.message.name, status=status).observe(elapsed)
+            if TRACE_SPANS:
+                print(f"[{current_request_id() or '-'}] tool {context.message.name} {status} {elapsed * 1000:.1f}ms")
+            request_id_var.reset(token)